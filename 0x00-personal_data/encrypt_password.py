@@ -3,16 +3,55 @@
 password file
 """
 
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator
+
 import bcrypt
 
 
-def hash_password(password: str) -> bytes:
+def get_rounds() -> int:
+    """
+    bcrypt cost from BCRYPT_ROUNDS, 12 by default.
+    """
+    return int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+
+def hash_password(password: str, rounds: int = None) -> bytes:
     """
     password using bcrypt.
     """
-    salt = bcrypt.gensalt()
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed_password
+    salt = bcrypt.gensalt(rounds or get_rounds())
+    return bcrypt.hashpw(password.encode('utf-8'), salt)
+
+
+def is_valid(hashed_password: bytes, password: str) -> bool:
+    """
+    Checks a password against its bcrypt hash.
+    """
+    return bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+
+
+def hash_passwords(passwords: Iterable[str], rounds: int = None,
+                   workers: int = None,
+                   window: int = None) -> Iterator[bytes]:
+    """
+    Hashes many passwords in a process pool and yields the hashes in
+    input order. At most window hashes are in flight at once, so the
+    input can be an arbitrarily long stream.
+    """
+    rounds = rounds or get_rounds()
+    workers = workers or os.cpu_count() or 1
+    window = window or workers * 4
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for password in passwords:
+            pending.append(pool.submit(hash_password, password, rounds))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the redaction strategies of filtered_logger and compares the
+results against a stored JSON baseline.
+"""
+
+import argparse
+import json
+import logging
+import platform
+import random
+import re
+import string
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from filtered_logger import (PII_FIELDS, RedactingFormatter, filter_datum,
+                             filter_datum_bytes)
+
+
+def legacy_filter_datum(fields: List[str], redaction: str,
+                        message: str, separator: str) -> str:
+    """
+    Reference per-field implementation, one re.sub per field.
+    The separator is escaped so that regex metacharacters stay usable.
+    """
+    pattern_sep = re.escape(separator)
+    for item in fields:
+        message = re.sub(item + '=.*?' + pattern_sep, item + '=' +
+                         redaction + separator, message)
+    return message
+
+
+def generate_messages(count: int = 10000, field_count: int = 8,
+                      value_length: int = 16, separator: str = ";",
+                      seed: int = 0) -> List[str]:
+    """
+    Generates synthetic key=value log messages. The PII fields come
+    first, followed by filler fields up to field_count.
+    """
+    rng = random.Random(seed)
+    names = list(PII_FIELDS[:field_count])
+    names += ["field{}".format(i) for i in range(field_count - len(names))]
+    alphabet = string.ascii_letters + string.digits + "@.-_ "
+    messages = []
+    for _ in range(count):
+        messages.append("".join(
+            "{}={}{}".format(name, "".join(
+                rng.choice(alphabet) for _ in range(value_length)),
+                separator)
+            for name in names))
+    return messages
+
+
+def strategies(separator: str) -> Dict[str, Callable]:
+    """
+    Returns the per-line redaction strategies to compare.
+    """
+    formatter = type("BenchFormatter", (RedactingFormatter,),
+                     {"SEPARATOR": separator})(PII_FIELDS)
+    fields = list(PII_FIELDS)
+
+    def formatter_format(message):
+        return formatter.format(logging.LogRecord(
+            "user_data", logging.INFO, __file__, 0, message, None, None))
+
+    def formatter_mapping(row):
+        return formatter.format(logging.LogRecord(
+            "user_data", logging.INFO, __file__, 0, row, None, None))
+
+    return {
+        "legacy_filter_datum": lambda message: legacy_filter_datum(
+            fields, "***", message, separator),
+        "filter_datum": lambda message: filter_datum(
+            fields, "***", message, separator),
+        "filter_datum_bytes": lambda message: filter_datum_bytes(
+            fields, "***", message, separator),
+        "formatter_format": formatter_format,
+        "formatter_mapping": formatter_mapping,
+    }
+
+
+def _percentile(ordered: List[int], pct: float) -> float:
+    """
+    Returns the pct percentile of an already sorted list.
+    """
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return float(ordered[index])
+
+
+def measure(func: Callable, messages: list, total_bytes: int,
+            alloc_sample: int = 1000) -> dict:
+    """
+    Measures throughput, per-line latency and allocations of func.
+    Allocations are sampled on alloc_sample lines: retained bytes and
+    blocks of the results, and the transient peak of each call, traced
+    in a session of its own (tracemalloc.reset_peak needs Python 3.9).
+    """
+    start = time.perf_counter()
+    for message in messages:
+        func(message)
+    elapsed = time.perf_counter() - start
+
+    latencies = []
+    clock = time.perf_counter_ns
+    for message in messages:
+        begin = clock()
+        func(message)
+        latencies.append(clock() - begin)
+    latencies.sort()
+
+    sample = messages[:alloc_sample]
+    kept = []
+    peak = 0
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for message in sample:
+        kept.append(func(message))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    blocks = sys.getallocatedblocks() - blocks
+    for message in sample:
+        tracemalloc.start()
+        func(message)
+        peak += tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    lines = max(len(sample), 1)
+
+    return {
+        "lines": len(messages),
+        "seconds": elapsed,
+        "lines_per_sec": len(messages) / elapsed if elapsed else 0.0,
+        "mb_per_sec": total_bytes / elapsed / 1e6 if elapsed else 0.0,
+        "p50_ns": _percentile(latencies, 50),
+        "p99_ns": _percentile(latencies, 99),
+        "alloc_bytes_per_line": (after - before) / lines,
+        "alloc_blocks_per_line": blocks / lines,
+        "peak_bytes_per_line": peak / lines,
+    }
+
+
+def run(count: int, field_count: int, value_length: int,
+        separator: str, seed: int = 0, only: List[str] = None) -> dict:
+    """
+    Runs every selected strategy over one generated message set.
+    """
+    messages = generate_messages(count, field_count, value_length,
+                                 separator, seed)
+    inputs = {
+        "bytes": [message.encode("utf-8") for message in messages],
+        "mapping": [dict(pair.split("=", 1)
+                         for pair in message.split(separator) if pair)
+                    for message in messages],
+    }
+    total_bytes = sum(len(message) for message in messages)
+    results = {}
+    for name, func in strategies(separator).items():
+        if only and name not in only:
+            continue
+        data = inputs.get(name.rsplit("_", 1)[-1], messages)
+        results[name] = measure(func, data, total_bytes)
+    return {
+        "config": {
+            "count": count,
+            "field_count": field_count,
+            "value_length": value_length,
+            "separator": separator,
+            "seed": seed,
+        },
+        "python": platform.python_version(),
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    Returns a description of every strategy whose throughput fell more
+    than tolerance (a fraction) below the baseline.
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        reference = baseline.get("results", {}).get(name)
+        if not reference or not reference.get("lines_per_sec"):
+            continue
+        ratio = result["lines_per_sec"] / reference["lines_per_sec"]
+        if ratio < 1 - tolerance:
+            regressions.append("{}: {:.0f} lines/sec vs baseline {:.0f} "
+                               "({:.1%})".format(
+                                   name, result["lines_per_sec"],
+                                   reference["lines_per_sec"], ratio - 1))
+    return regressions
+
+
+def main() -> int:
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--fields", type=int, default=8)
+    parser.add_argument("--value-length", type=int, default=16)
+    parser.add_argument("--separator", default=";")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--strategy", action="append",
+                        help="only run this strategy (repeatable)")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed throughput drop, as a fraction")
+    args = parser.parse_args()
+
+    report = run(args.count, args.fields, args.value_length,
+                 args.separator, args.seed, args.strategy)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            print("REGRESSION " + line, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,12 +3,15 @@
 from flask import request
 from typing import TypeVar
 from api.v1.auth.auth import Auth
+from api.v1.auth.principal_cache import principal_cache
 from models.user import User
 import base64
+import binascii
 
 
 class BasicAuth(Auth):
     """BasicAuth Class"""
+    principal_cache = principal_cache
 
     def extract_base64_authorization_header(
             self, authorization_header: str) -> str:
@@ -42,6 +45,24 @@ class BasicAuth(Auth):
         except Exception:
             return None
 
+    def parse_authorization_header(
+            self, authorization_header: str) -> (str, str):
+        """Return the user email and password of a Basic Authorization
+        header in one pass: the extract/decode steps fused, decoding the
+        Base64 strictly. (None, None) when the header is malformed"""
+        if not isinstance(authorization_header, str) or \
+                not authorization_header.startswith('Basic '):
+            return None, None
+        try:
+            decoded = base64.b64decode(authorization_header[6:],
+                                       validate=True)
+            email, colon, pwd = decoded.partition(b':')
+            if not colon:
+                return None, None
+            return email.decode('utf-8'), pwd.decode('utf-8')
+        except (binascii.Error, ValueError, TypeError):
+            return None, None
+
     def user_object_from_credentials(
             self, user_email: str, user_pwd: str) -> TypeVar('User'):
         """Return the User instance based on email and password"""
@@ -57,12 +78,17 @@ class BasicAuth(Auth):
         return None
 
     def current_user(self, request=None) -> TypeVar('User'):
-        """Overloads Auth and retrieves the User instance for a request"""
+        """Overloads Auth and retrieves the User instance for a request
+        Users already resolved from the same header come from the cache"""
         try:
             header = self.authorization_header(request)
-            base64_h = self.extract_base64_authorization_header(header)
-            decode_h = self.decode_base64_authorization_header(base64_h)
-            credents = self.extract_user_credentials(decode_h)
-            return self.user_object_from_credentials(credents[0], credents[1])
+            user = self.principal_cache.get(header)
+            if user is not None:
+                return user
+            generation = self.principal_cache.generation
+            credents = self.parse_authorization_header(header)
+            user = self.user_object_from_credentials(credents[0], credents[1])
+            self.principal_cache.put(header, user, generation)
+            return user
         except Exception:
             return None
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+""" Micro-benchmarks of the API authentication: Auth.require_auth with
+the compiled PathMatcher against the former loop over the excluded paths,
+and BasicAuth header parsing in one pass against the chain of steps
+"""
+import argparse
+import base64
+import json
+import timeit
+
+from api.v1.auth.auth import Auth, PathMatcher
+from api.v1.auth.basic_auth import BasicAuth
+
+
+def loop_require_auth(path: str, excluded_paths: list) -> bool:
+    """ The former require_auth, with the wildcard prefix fixed
+    """
+    if path is None or excluded_paths is None or not len(excluded_paths):
+        return True
+    if path[-1] != '/':
+        path += '/'
+    for i in excluded_paths:
+        if i.endswith('*'):
+            if path.startswith(i[:-1]):
+                return False
+    return False if path in excluded_paths else True
+
+
+def excluded_paths(count: int) -> list:
+    """ count excluded paths, half exact and half wildcard prefixes
+    """
+    paths = []
+    for i in range(count):
+        if i % 2:
+            paths.append("/api/v1/public{}/*".format(i))
+        else:
+            paths.append("/api/v1/open{}/".format(i))
+    return paths
+
+
+AGREEMENT_CASES = [
+    (["/api/v1/st*tus/"],
+     ["/api/v1/stats/", "/api/v1/st*tus/", "/api/v1/status/"]),
+    (["/a*b/", "/a*"], ["/a*b/", "/a", "/ab/", "/a*c/", "/b/"]),
+    (["/a*", "/a*b/"], ["/a*b/", "/a", "/ab/", "/b/"]),
+    (["/a/", "/a/*", "*"], ["/a", "/a/b", "/", "/b"]),
+    (["/a.b/", "/(x)/*"], ["/a.b", "/axb", "/(x)/y", "/x/y"]),
+]
+
+
+def check_agreement(auth: Auth):
+    """ Raise when the matcher and the loop disagree on AGREEMENT_CASES
+    """
+    for excluded, paths in AGREEMENT_CASES:
+        matcher = PathMatcher(excluded)
+        for path in paths:
+            if auth.require_auth(path, matcher) != \
+                    loop_require_auth(path, excluded):
+                raise AssertionError("matcher disagrees on {} with {}"
+                                     .format(path, excluded))
+
+
+def require_auth(count: int, number: int) -> dict:
+    """ Time the loop and the matcher on excluded and protected paths
+    """
+    excluded = excluded_paths(count)
+    matcher = PathMatcher(excluded)
+    auth = Auth()
+    check_agreement(auth)
+    paths = ["/api/v1/users/", "/api/v1/open0",
+             "/api/v1/public{}/deep/path".format(count - 1)]
+    for path in paths:
+        if auth.require_auth(path, matcher) != \
+                loop_require_auth(path, excluded):
+            raise AssertionError("matcher disagrees on {}".format(path))
+    result = {"excluded_paths": count}
+    for name, func, arg in (("loop", loop_require_auth, excluded),
+                            ("matcher", auth.require_auth, matcher)):
+        seconds = timeit.timeit(
+            lambda: [func(path, arg) for path in paths], number=number)
+        result[name + "_us"] = round(seconds * 1e6 / number / len(paths), 3)
+    result["speedup"] = round(result["loop_us"] / result["matcher_us"], 1)
+    return result
+
+
+def parse_header(number: int) -> dict:
+    """ Time the chain of BasicAuth steps and parse_authorization_header
+    on a valid header and on malformed ones
+    """
+    auth = BasicAuth()
+    valid = base64.b64encode(b"bob@hbtn.io:H0lbertonSchool98!").decode()
+    headers = ["Basic " + valid, "Basic " + valid[:-2] + "!!",
+               "Bearer " + valid]
+
+    def chain(header: str) -> tuple:
+        """ The former parse, one step method after the other """
+        base64_h = auth.extract_base64_authorization_header(header)
+        decode_h = auth.decode_base64_authorization_header(base64_h)
+        return auth.extract_user_credentials(decode_h)
+
+    result = {}
+    for name, func in (("chain", chain),
+                       ("fused", auth.parse_authorization_header)):
+        seconds = timeit.timeit(
+            lambda: [func(header) for header in headers], number=number)
+        result[name + "_us"] = round(seconds * 1e6 / number / len(headers),
+                                     3)
+    result["speedup"] = round(result["chain_us"] / result["fused_us"], 1)
+    return result
+
+
+def main():
+    """ Command line entry point
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    sub = parser.add_subparsers(dest="command", required=True)
+    require_parser = sub.add_parser("require-auth",
+                                    help="excluded paths lookup")
+    require_parser.add_argument("--paths", type=int, action="append",
+                                help="number of excluded paths")
+    require_parser.add_argument("--number", type=int, default=20000)
+    parse_parser = sub.add_parser("parse-header",
+                                  help="Basic Authorization header parsing")
+    parse_parser.add_argument("--number", type=int, default=100000)
+    args = parser.parse_args()
+
+    if args.command == "require-auth":
+        for count in args.paths or [3, 30, 300]:
+            print(json.dumps(require_auth(count, args.number)))
+    elif args.command == "parse-header":
+        print(json.dumps(parse_header(args.number)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+""" Benchmarks of the file-backed model store
+Runs in a temporary directory so the real .db_*.json files are untouched
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from models.base import DATA, STORAGES
+from models.user import User
+
+
+@contextmanager
+def scratch_dir():
+    """ Run the body inside a fresh temporary directory
+    """
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            yield directory
+        finally:
+            os.chdir(cwd)
+
+
+def make_users(count: int) -> list:
+    """ Create count users in memory and persist them once
+    """
+    User.load_from_file()
+    users = []
+    for i in range(count):
+        user = User(email="user{}@hbtn.io".format(i),
+                    first_name="First{}".format(i),
+                    last_name="Last{}".format(i))
+        user.password = "pwd{}".format(i)
+        if User.storage_backend == "file":
+            DATA['User'][user.id] = user
+        else:
+            user.save()
+        users.append(user)
+    if User.storage_backend == "file":
+        User.save_to_file()
+    User.load_from_file()
+    return User.all()
+
+
+def concurrent_save(users: int, threads: int, saves: int,
+                    mode: str) -> dict:
+    """ Save random users from several threads and time the throughput
+    mode is snapshot, journal, group (group commit on snapshots) or
+    sqlite (the SQLite backend, in a database of the scratch directory)
+    """
+    User.storage_mode = "journal" if mode == "journal" else "snapshot"
+    User.group_commit = mode == "group"
+    User.storage_backend = "sqlite" if mode == "sqlite" else "file"
+    STORAGES.pop("sqlite", None)
+    with scratch_dir():
+        population = make_users(users)
+        errors = []
+
+        def worker(offset: int):
+            try:
+                for i in range(saves):
+                    user = population[(offset + i * threads) % users]
+                    user.first_name = "T{}-{}".format(offset, i)
+                    user.save()
+            except Exception as e:
+                errors.append(e)
+
+        workers = [threading.Thread(target=worker, args=(n,))
+                   for n in range(threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        User.flush()
+        elapsed = time.perf_counter() - start
+
+        User.load_from_file()
+        intact = User.count() == users
+        if "sqlite" in STORAGES:
+            STORAGES.pop("sqlite").close()
+    User.storage_backend = "file"
+    total = threads * saves
+    return {
+        "mode": mode,
+        "users": users,
+        "threads": threads,
+        "saves": total,
+        "seconds": elapsed,
+        "saves_per_sec": total / elapsed if elapsed else 0.0,
+        "intact": intact and not errors,
+    }
+
+
+def cold_load(users: int) -> dict:
+    """ Time a synchronous load and the return of a background load
+    """
+    with scratch_dir():
+        make_users(users)
+        start = time.perf_counter()
+        User.load_from_file()
+        load = time.perf_counter() - start
+
+        start = time.perf_counter()
+        loading = User.load_from_file(background=True)
+        returned = time.perf_counter() - start
+        loading.wait()
+        ready = time.perf_counter() - start
+        intact = User.count() == users
+    return {
+        "users": users,
+        "load_seconds": load,
+        "background_return_seconds": returned,
+        "background_ready_seconds": ready,
+        "intact": intact,
+    }
+
+
+def snapshot_formats(users: int, formats: list) -> list:
+    """ Compare save time, load time and file size of snapshot formats
+    """
+    results = []
+    default = User.snapshot_format
+    try:
+        for snapshot_format in formats:
+            User.snapshot_format = snapshot_format
+            with scratch_dir():
+                make_users(users)
+                start = time.perf_counter()
+                User.load_from_file()
+                load = time.perf_counter() - start
+                start = time.perf_counter()
+                User.save_to_file()
+                save = time.perf_counter() - start
+                size = os.path.getsize(User._snapshot_path())
+                intact = User.count() == users
+            results.append({
+                "format": snapshot_format,
+                "users": users,
+                "save_seconds": save,
+                "load_seconds": load,
+                "bytes": size,
+                "intact": intact,
+            })
+    finally:
+        User.snapshot_format = default
+    return results
+
+
+def memory(users: int) -> dict:
+    """ Bytes held per loaded user, attribute values excluded
+    The stored records are decoded before tracing starts, so only the
+    objects themselves are measured
+    """
+    with scratch_dir():
+        make_users(users)
+        records = [user.to_json(True) for user in User.all()]
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        loaded = [User(**record) for record in records]
+        used = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    return {
+        "users": len(loaded),
+        "bytes": used,
+        "bytes_per_user": used / len(loaded) if loaded else 0.0,
+    }
+
+
+def main():
+    """ Command line entry point
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    sub = parser.add_subparsers(dest="command", required=True)
+    save_parser = sub.add_parser("concurrent-save",
+                                 help="multi-threaded save throughput")
+    save_parser.add_argument("--users", type=int, default=1000)
+    save_parser.add_argument("--threads", type=int, default=8)
+    save_parser.add_argument("--saves", type=int, default=50,
+                             help="saves per thread")
+    save_parser.add_argument("--mode", action="append",
+                             choices=["snapshot", "journal", "group",
+                                      "sqlite"])
+    load_parser = sub.add_parser("load", help="cold start load time")
+    load_parser.add_argument("--users", type=int, default=10000)
+    format_parser = sub.add_parser("snapshot",
+                                   help="snapshot format save/load/size")
+    format_parser.add_argument("--users", type=int, default=10000)
+    format_parser.add_argument("--format", action="append",
+                               choices=["json", "binary"])
+    memory_parser = sub.add_parser("memory", help="memory per user")
+    memory_parser.add_argument("--users", type=int, default=10000)
+    args = parser.parse_args()
+
+    if args.command == "concurrent-save":
+        for mode in args.mode or ["snapshot", "journal", "group",
+                                  "sqlite"]:
+            print(json.dumps(concurrent_save(args.users, args.threads,
+                                             args.saves, mode)))
+    elif args.command == "load":
+        print(json.dumps(cold_load(args.users)))
+    elif args.command == "memory":
+        print(json.dumps(memory(args.users)))
+    elif args.command == "snapshot":
+        for result in snapshot_formats(args.users,
+                                       args.format or ["json", "binary"]):
+            print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+""" Main 2
+"""
+import base64
+from flask import Flask, request
+from api.v1.auth.basic_auth import BasicAuth
+from models.user import User
+
+""" Create a user test """
+user_email = "bob@hbtn.io"
+user_clear_pwd = "H0lbertonSchool98!"
+user = User()
+user.email = user_email
+user.password = user_clear_pwd
+print("New user: {}".format(user.id))
+user.save()
+
+basic_clear = "{}:{}".format(user_email, user_clear_pwd)
+basic_header = base64.b64encode(basic_clear.encode('utf-8')).decode("utf-8")
+print("Basic Base64: {}".format(basic_header))
+
+app = Flask(__name__)
+a = BasicAuth()
+
+for header in ("Basic " + basic_header,
+               "Basic " + basic_header[:-2] + "!!",
+               "Basic " + basic_header + "é",
+               "Bearer " + basic_header):
+    print(a.parse_authorization_header(header))
+    with app.test_request_context(headers={'Authorization': header}):
+        current = a.current_user(request)
+        print(current.id == user.id if current else current)
+
+user.remove()
@@ -1,37 +1,369 @@
 #!/usr/bin/env python3
 """ Base module
 """
+from contextlib import contextmanager
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
+from typing import TypeVar, List, Iterable, Dict, Optional
+from os import getenv, path
+import atexit
+import bisect
 import json
+import os
+import threading
 import uuid
 
+from models import snapshot
+
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DATA = {}
+INDEXES = {}
+JOURNAL_SIZES = {}
+PENDING = {}
+FLUSH_TIMERS = {}
+LOCKS = {}
+COMPACTING = set()
+LOADING = {}
+FIELDS = {}
+ORDER = {}
+DAILY = {}
+LISTENERS = []
+_locks_lock = threading.Lock()
+_pending_lock = threading.Lock()
+
+
+class RWLock():
+    """ Readers-writer lock: shared readers, one exclusive writer
+    Waiting writers hold back new readers so writes can't starve
+    """
+
+    def __init__(self):
+        """ Initialize an unlocked lock
+        """
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        """ Hold the lock shared
+        """
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        """ Hold the lock exclusively
+        """
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+def _lock(kind: str, s_class: str, factory=threading.Lock):
+    """ Per-class lock: "data" guards DATA and INDEXES, "file" guards
+    the journal, "snapshot" serializes snapshot writes and "flush"
+    serializes group commits, "compact" serializes compactions
+    Lock order is compact or flush, then data, then snapshot, then file
+    """
+    with _locks_lock:
+        lock = LOCKS.get((kind, s_class))
+        if lock is None:
+            lock = LOCKS[(kind, s_class)] = factory()
+        return lock
+
+
+def _file_lock(s_class: str) -> threading.Lock:
+    """ Lock serializing journal writes of one class
+    """
+    return _lock("file", s_class)
+
+
+def _data_lock(s_class: str) -> RWLock:
+    """ Readers-writer lock guarding the objects of one class
+    """
+    return _lock("data", s_class, RWLock)
+
+
+def _fsync_dir(directory: str):
+    """ Make a rename in directory durable, where the OS allows it
+    """
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _wait_loaded(s_class: str):
+    """ Block until a background load of the class has finished
+    """
+    loading = LOADING.get(s_class)
+    if loading is not None:
+        loading.wait()
+        if loading.error is not None:
+            raise loading.error
+
+
+def iter_json_object(f, chunk_size: int = 1 << 16):
+    """ Yield the (key, value) pairs of a top-level JSON object
+    The file is read chunk_size characters at a time and each member is
+    decoded on its own, so the whole document is never held in memory
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    def peek() -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf) or eof:
+                return buf[pos:pos + 1]
+            fill()
+
+    def decode():
+        nonlocal pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                # a number ending at the buffer edge may continue
+                if end < len(buf) or eof:
+                    pos = end
+                    return value
+            except ValueError:
+                if eof:
+                    raise
+            fill()
+
+    if peek() != "{":
+        raise ValueError("Expecting a JSON object")
+    pos += 1
+    if peek() == "}":
+        return
+    while True:
+        peek()
+        key = decode()
+        if peek() != ":":
+            raise ValueError("Expecting ':' delimiter")
+        pos += 1
+        peek()
+        yield key, decode()
+        delimiter = peek()
+        pos += 1
+        if delimiter == "}":
+            return
+        if delimiter != ",":
+            raise ValueError("Expecting ',' delimiter")
+
+
+class Loading():
+    """ Progress of a background load
+    """
+
+    def __init__(self):
+        """ Initialize an unfinished load
+        """
+        self.done = threading.Event()
+        self.error = None
+
+    def wait(self, timeout: float = None) -> bool:
+        """ Wait for the load to finish
+        """
+        return self.done.wait(timeout)
+
+
+class Timestamp():
+    """ Datetime attribute kept as its stored string until first read,
+    so loading doesn't pay for a strptime per timestamp
+    The value lives in the "_<name>" slot of the owner
+    """
+
+    def __set_name__(self, owner, name: str):
+        """ Remember the attribute and slot names
+        """
+        self.name = name
+        self.slot = "_" + name
+
+    def __get__(self, obj, objtype=None):
+        """ Parse the stored string on first access
+        """
+        if obj is None:
+            return self
+        value = getattr(obj, self.slot)
+        if type(value) is str:
+            value = datetime.strptime(value, TIMESTAMP_FORMAT)
+            setattr(obj, self.slot, value)
+        return value
+
+    def __set__(self, obj, value):
+        """ Store a datetime or a TIMESTAMP_FORMAT string
+        """
+        setattr(obj, self.slot, value)
+
+
+def add_listener(listener):
+    """ Call listener(event, cls, objs) after every write of a model:
+    "save" and "remove" with the objects written, "load" with none
+    Listeners run in the writing thread once its locks are released
+    """
+    LISTENERS.append(listener)
+
+
+def notify(event: str, cls, objs: list):
+    """ Tell the listeners about a write
+    """
+    for listener in LISTENERS:
+        listener(event, cls, objs)
+
+
+def flush_all():
+    """ Flush the pending group commits of every class
+    """
+    for cls, _ in list(PENDING.values()):
+        cls.flush()
+
+
+atexit.register(flush_all)
+
+
+class Index():
+    """ Secondary index of one attribute: value -> objects
+    """
+
+    def __init__(self, attribute: str, unique: bool = False):
+        """ Initialize an empty index
+        """
+        self.attribute = attribute
+        self.unique = unique
+        self.buckets = {}
+        self.keys = {}
+        self.unhashable = {}
+
+    def _key(self, obj: TypeVar('Base')):
+        """ Indexed value of an object, None if it can't be hashed
+        """
+        value = getattr(obj, self.attribute, None)
+        try:
+            hash(value)
+        except TypeError:
+            return None, False
+        return value, True
+
+    def check(self, obj: TypeVar('Base')):
+        """ Raise ValueError if obj would break a unique index
+        """
+        if not self.unique:
+            return
+        value, hashable = self._key(obj)
+        if not hashable or value is None:
+            return
+        for obj_id in self.buckets.get(value, {}):
+            if obj_id != obj.id:
+                raise ValueError("{} {} already exists".format(
+                    self.attribute, value))
+
+    def add(self, obj: TypeVar('Base')):
+        """ Index an object, moving it if its value changed
+        """
+        value, hashable = self._key(obj)
+        if obj.id in self.keys and self.keys[obj.id] == value and \
+                obj.id in self.buckets.get(value, {}):
+            self.buckets[value][obj.id] = obj
+            return
+        self.discard(obj.id)
+        if not hashable:
+            self.unhashable[obj.id] = obj
+            return
+        self.keys[obj.id] = value
+        self.buckets.setdefault(value, {})[obj.id] = obj
+
+    def discard(self, obj_id: str):
+        """ Remove an object from the index
+        """
+        self.unhashable.pop(obj_id, None)
+        if obj_id not in self.keys:
+            return
+        value = self.keys.pop(obj_id)
+        bucket = self.buckets.get(value)
+        if bucket is not None:
+            bucket.pop(obj_id, None)
+            if not bucket:
+                del self.buckets[value]
+
+    def lookup(self, value) -> Optional[List[TypeVar('Base')]]:
+        """ Objects indexed under value, None if value can't be hashed
+        """
+        try:
+            bucket = self.buckets.get(value, {})
+        except TypeError:
+            return None
+        return list(bucket.values()) + list(self.unhashable.values())
 
 
 class Base():
     """ Base class
+    Attributes live in __slots__; subclasses declare theirs the same way
     """
+    __slots__ = ("id", "_created_at", "_updated_at")
+    indexed_attributes: Dict[str, bool] = {}
+    storage_mode: str = getenv("STORAGE_MODE", "snapshot")
+    compact_after: int = int(getenv("JOURNAL_COMPACT_AFTER", "1000"))
+    group_commit: bool = getenv("GROUP_COMMIT", "0") == "1"
+    flush_interval: float = float(getenv("FLUSH_INTERVAL", "0.05"))
+    flush_count: int = int(getenv("FLUSH_COUNT", "100"))
+    snapshot_format: str = getenv("SNAPSHOT_FORMAT", "json")
+    storage_backend: str = getenv("STORAGE_BACKEND", "file")
+    created_at = Timestamp()
+    updated_at = Timestamp()
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
         s_class = str(self.__class__.__name__)
         if DATA.get(s_class) is None:
-            DATA[s_class] = {}
+            DATA.setdefault(s_class, {})
 
-        self.id = kwargs.get('id', str(uuid.uuid4()))
+        self.id = kwargs.get('id') or str(uuid.uuid4())
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = kwargs.get('created_at')
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = kwargs.get('updated_at')
         else:
             self.updated_at = datetime.utcnow()
 
@@ -44,11 +376,45 @@ class Base():
             return False
         return (self.id == other.id)
 
+    @classmethod
+    def _field_slots(cls) -> tuple:
+        """ (name, slot) of every declared attribute, base classes first
+        Timestamp slots are named after their attribute
+        """
+        fields = FIELDS.get(cls)
+        if fields is None:
+            fields = []
+            for klass in reversed(cls.__mro__):
+                slots = klass.__dict__.get("__slots__", ())
+                if isinstance(slots, str):
+                    slots = (slots,)
+                for slot in slots:
+                    if slot in ("__dict__", "__weakref__"):
+                        continue
+                    name = slot[1:]
+                    if not isinstance(getattr(cls, name, None), Timestamp):
+                        name = slot
+                    fields.append((name, slot))
+            fields = FIELDS[cls] = tuple(fields)
+        return fields
+
+    def _fields(self) -> Iterable:
+        """ Stored attributes as (name, value) pairs, timestamps as stored
+        Unset slots are skipped; a subclass without __slots__ adds its
+        __dict__
+        """
+        for name, slot in self._field_slots():
+            try:
+                yield name, getattr(self, slot)
+            except AttributeError:
+                pass
+        yield from getattr(self, "__dict__", {}).items()
+
     def to_json(self, for_serialization: bool = False) -> dict:
         """ Convert the object a JSON dictionary
         """
         result = {}
-        for key, value in self.__dict__.items():
+        for key, value in self._fields():
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
@@ -58,55 +424,332 @@ class Base():
         return result
 
     @classmethod
-    def load_from_file(cls):
+    def _indexes(cls) -> Dict[str, Index]:
+        """ Secondary indexes of the class, built on first use
+        """
+        s_class = cls.__name__
+        indexes = INDEXES.get(s_class)
+        if indexes is None:
+            indexes = {}
+            for attribute, unique in cls.indexed_attributes.items():
+                indexes[attribute] = Index(attribute, unique)
+            for obj in DATA.get(s_class, {}).values():
+                for index in indexes.values():
+                    index.add(obj)
+            INDEXES[s_class] = indexes
+        return indexes
+
+    @classmethod
+    def _file_path(cls, suffix: str = "json") -> str:
+        """ Path of one of the class storage files
+        """
+        return ".db_{}.{}".format(cls.__name__, suffix)
+
+    @classmethod
+    def _snapshot_path(cls, snapshot_format: str = None) -> str:
+        """ Path of the snapshot file in a format, the class one by default
+        """
+        snapshot_format = snapshot_format or cls.snapshot_format
+        return cls._file_path("bin" if snapshot_format == "binary"
+                              else "json")
+
+    @classmethod
+    def load_from_file(cls, background: bool = False):
         """ Load all objects from file
+        The snapshot is streamed first, then any journal is replayed on
+        top. With background, the load runs in a thread and returns at
+        once; reads and writes of the class wait until it has finished.
+        Other storage backends only prepare their storage of the class.
+        """
+        return cls._storage().load(cls, background)
+
+    @classmethod
+    def _load(cls):
+        """ Replace the objects of the class with the stored ones
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
+        cls.flush()
+        with _lock("compact", s_class), _data_lock(s_class).write(), \
+                _file_lock(s_class):
+            DATA[s_class] = {}
+            INDEXES.pop(s_class, None)
+            ORDER.pop(s_class, None)
+            DAILY.pop(s_class, None)
+            JOURNAL_SIZES[s_class] = 0
+
+            formats = sorted(("json", "binary"),
+                             key=lambda name: name != cls.snapshot_format)
+            for snapshot_format in formats:
+                file_path = cls._snapshot_path(snapshot_format)
+                if not path.exists(file_path):
+                    continue
+                if snapshot_format == "binary":
+                    with open(file_path, 'rb') as f:
+                        for obj_json in snapshot.iter_records(f):
+                            DATA[s_class][obj_json["id"]] = cls(**obj_json)
+                else:
+                    with open(file_path, 'r') as f:
+                        for obj_id, obj_json in iter_json_object(f):
+                            DATA[s_class][obj_id] = cls(**obj_json)
+                break
+
+            journals = [cls._file_path(suffix)
+                        for suffix in ("journal.1", "journal")]
+            replayed = False
+            for journal_path in journals:
+                if path.exists(journal_path):
+                    replayed = True
+                    JOURNAL_SIZES[s_class] += cls._replay_journal(
+                        journal_path)
+            cls._indexes()
+        if replayed and cls.storage_mode != "journal":
+            cls.compact()
+        notify("load", cls, [])
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+    @classmethod
+    def _replay_journal(cls, journal_path: str) -> int:
+        """ Apply the records of a journal file to DATA
+        A torn last line (crash during append) is cut off the file, or
+        given back its newline if it is a whole record, so that the next
+        append doesn't run into it
+        """
+        s_class = cls.__name__
+        count = 0
+        complete = 0
+        torn = False
+        with open(journal_path, 'rb') as f:
+            for line in f:
+                torn = not line.endswith(b"\n")
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    if not torn:
+                        complete += len(line)
+                    continue
+                complete += len(line)
+                if record.get("op") == "save":
+                    DATA[s_class][record["id"]] = cls(**record["obj"])
+                elif record.get("op") == "remove":
+                    DATA[s_class].pop(record["id"], None)
+                count += 1
+        if torn:
+            with open(journal_path, 'r+b') as f:
+                f.truncate(complete)
+                if complete:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        f.write(b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+        return count
+
+    @classmethod
+    def _records(cls) -> dict:
+        """ Stored form of all objects in the class snapshot format
+        The caller holds the data lock
+        """
+        objs = DATA[cls.__name__]
+        if cls.snapshot_format == "binary":
+            return {obj_id: dict(obj._fields())
+                    for obj_id, obj in objs.items()}
+        return {obj_id: obj.to_json(True) for obj_id, obj in objs.items()}
+
+    @classmethod
+    def _serialize(cls) -> dict:
+        """ Stored form of all objects, taken under the read lock
+        """
+        with _data_lock(cls.__name__).read():
+            return cls._records()
+
+    @classmethod
+    def _write_snapshot(cls, objs_json: dict):
+        """ Write a full snapshot file crash-safely: write a temp file,
+        fsync it, then atomically rename it over the old snapshot.
+        A snapshot left in the other format is stale and is removed.
+        """
+        binary = cls.snapshot_format == "binary"
+        file_path = cls._snapshot_path()
+        tmp_path = "{}.{}.{}.tmp".format(file_path, os.getpid(),
+                                         threading.get_ident())
+        try:
+            with open(tmp_path, 'wb' if binary else 'w') as f:
+                if binary:
+                    snapshot.dump(objs_json.values(), f)
+                else:
+                    json.dump(objs_json, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        other = cls._snapshot_path("json" if binary else "binary")
+        if path.exists(other):
+            os.remove(other)
+        _fsync_dir(path.dirname(path.abspath(file_path)))
 
     @classmethod
     def save_to_file(cls):
         """ Save all objects to file
+        The read lock is held until the file is written, so no write
+        can slip in between serializing and replacing the snapshot
+        """
+        s_class = cls.__name__
+        with _data_lock(s_class).read(), _lock("snapshot", s_class):
+            cls._write_snapshot(cls._records())
+
+    @classmethod
+    def _append_journal(cls, records: List[dict], durable: bool = False):
+        """ Append records to the journal, compacting in the background
+        once it holds compact_after records. A durable append is synced
+        to disk before returning
+        """
+        s_class = cls.__name__
+        lines = "".join(json.dumps(record) + "\n" for record in records)
+        with _file_lock(s_class):
+            with open(cls._file_path("journal"), 'a') as f:
+                f.write(lines)
+                if durable:
+                    f.flush()
+                    os.fsync(f.fileno())
+            size = JOURNAL_SIZES.get(s_class, 0) + len(records)
+            JOURNAL_SIZES[s_class] = size
+            due = size >= cls.compact_after and s_class not in COMPACTING
+            if due:
+                COMPACTING.add(s_class)
+        if due:
+            threading.Thread(target=cls.compact, daemon=True).start()
+
+    @classmethod
+    def compact(cls):
+        """ Fold the journal into a new snapshot
+        The journal is rotated first, so appends continue while the
+        snapshot is written; the rotated file is deleted afterwards.
+        Records appended after the rotation may already be part of the
+        snapshot: replaying them again is harmless.
+        """
+        s_class = cls.__name__
+        journal = cls._file_path("journal")
+        rotated = cls._file_path("journal.1")
+        try:
+            with _lock("compact", s_class):
+                with _file_lock(s_class):
+                    if path.exists(journal):
+                        if path.exists(rotated):
+                            with open(journal, 'r') as src, \
+                                    open(rotated, 'a') as dst:
+                                dst.write(src.read())
+                            os.remove(journal)
+                        else:
+                            os.replace(journal, rotated)
+                    JOURNAL_SIZES[s_class] = 0
+                objs_json = cls._serialize()
+                with _lock("snapshot", s_class):
+                    cls._write_snapshot(objs_json)
+                if path.exists(rotated):
+                    os.remove(rotated)
+        finally:
+            COMPACTING.discard(s_class)
+
+    @classmethod
+    def _log_write(cls, records: List[dict], durable: bool = False) -> bool:
+        """ Record writes while the data write lock is held, so that
+        records reach storage in the order DATA changed; a durable
+        journal append is synced to disk at once
+        Returns True when a group commit batch is due
+        """
+        if cls.group_commit:
+            s_class = cls.__name__
+            with _pending_lock:
+                pending = PENDING.setdefault(s_class, (cls, []))[1]
+                pending.extend(records)
+                if len(pending) >= cls.flush_count:
+                    return True
+                if s_class not in FLUSH_TIMERS:
+                    timer = threading.Timer(cls.flush_interval, cls.flush)
+                    timer.daemon = True
+                    FLUSH_TIMERS[s_class] = timer
+                    timer.start()
+            return False
+        if cls.storage_mode == "journal":
+            cls._append_journal(records, durable)
+        return False
+
+    @classmethod
+    def _after_write(cls, due: bool, durable: bool):
+        """ Finish a write once the data write lock is released
+        A group commit batch is flushed after flush_count records or
+        flush_interval seconds, whichever comes first; durable writes
+        flush at once. Snapshot mode without batching rewrites the file.
+        """
+        if cls.group_commit:
+            if due or durable:
+                cls.flush()
+        elif cls.storage_mode != "journal":
+            cls.save_to_file()
+
+    @classmethod
+    def flush(cls):
+        """ Write every pending group commit of the class
+        Returns once the writes queued before the call are on disk: in
+        journal mode the journal is synced even with nothing pending
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        with _lock("flush", s_class):
+            with _pending_lock:
+                _, records = PENDING.pop(s_class, (cls, []))
+                timer = FLUSH_TIMERS.pop(s_class, None)
+            if timer is not None:
+                timer.cancel()
+            if cls.storage_mode == "journal":
+                if records or path.exists(cls._file_path("journal")):
+                    cls._append_journal(records, True)
+            elif records:
+                cls.save_to_file()
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+    @classmethod
+    def _storage(cls):
+        """ Storage backend of the class
+        """
+        return get_storage(cls.storage_backend)
 
-    def save(self):
+    def save(self, durable: bool = False):
         """ Save current object
         """
-        s_class = self.__class__.__name__
-        self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        self.__class__._storage().save(self, durable)
 
-    def remove(self):
+    @classmethod
+    def write_many(cls, saves: Iterable[TypeVar('Base')] = (),
+                   removes: Iterable[TypeVar('Base')] = (),
+                   durable: bool = False) -> list:
+        """ Save and remove objects of the class with a single write
+        Returns, per saved object, None or the ValueError that kept it
+        out (a unique index conflict)
+        """
+        return cls._storage().write_many(cls, list(saves), list(removes),
+                                         durable)
+
+    def remove(self, durable: bool = False):
         """ Remove object
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        self.__class__._storage().remove(self, durable)
+
+    @classmethod
+    def compare_and_set(cls, id: str, attribute: str, expected,
+                        value) -> bool:
+        """ Set one attribute of a stored object if it still equals
+        expected, in one atomic step; only that attribute and updated_at
+        are written. Returns whether the object was updated
+        """
+        return cls._storage().compare_and_set(cls, id, attribute,
+                                              expected, value)
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
-        s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        return cls._storage().count(cls)
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -118,20 +761,328 @@ class Base():
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
-        s_class = cls.__name__
-        return DATA[s_class].get(id)
+        return cls._storage().get(cls, id)
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
         """
+        return cls._storage().search(cls, attributes)
+
+    @classmethod
+    def page(cls, limit: int = None, after: str = None,
+             offset: int = 0) -> List[TypeVar('Base')]:
+        """ Objects ordered by ID: at most limit of them, skipping offset,
+        with IDs greater than after (the last ID of the previous page)
+        """
+        return cls._storage().page(cls, limit, after, offset)
+
+    @classmethod
+    def created_per_day(cls) -> Dict[str, int]:
+        """ Number of objects by creation day (YYYY-MM-DD)
+        """
+        return cls._storage().created_per_day(cls)
+
+    def _created_day(self) -> str:
+        """ Creation day, without parsing a timestamp still stored as text
+        """
+        created_at = self._created_at
+        if type(created_at) is str:
+            return created_at[:10]
+        return created_at.strftime("%Y-%m-%d")
+
+
+def match_attributes(obj: Base, attributes: dict) -> bool:
+    """ Tell whether obj has every attribute value of attributes
+    """
+    for k, v in attributes.items():
+        if (getattr(obj, k) != v):
+            return False
+    return True
+
+
+class FileStorage():
+    """ Storage backend keeping the objects of each process in DATA,
+    persisted to the .db_<Class> snapshot and journal files
+    """
+
+    def load(self, cls, background: bool = False):
+        """ Load the objects of cls from its files
+        """
+        s_class = cls.__name__
+        if background:
+            loading = LOADING[s_class] = Loading()
+
+            def run():
+                try:
+                    cls._load()
+                except Exception as e:
+                    loading.error = e
+                finally:
+                    loading.done.set()
+
+            threading.Thread(target=run, daemon=True).start()
+            return loading
+        loading = LOADING.get(s_class)
+        if loading is not None:
+            loading.wait()
+        cls._load()
+        if LOADING.get(s_class) is loading:
+            LOADING.pop(s_class, None)
+
+    def save(self, obj: Base, durable: bool = False):
+        """ Store obj, ValueError if it breaks a unique index
+        """
+        error = self.write_many(obj.__class__, [obj], [], durable)[0]
+        if error is not None:
+            raise error
+
+    def remove(self, obj: Base, durable: bool = False):
+        """ Delete obj
+        """
+        self.write_many(obj.__class__, [], [obj], durable)
+
+    def _put(self, cls, obj: Base) -> Optional[Base]:
+        """ Store obj in DATA, its indexes, sorted IDs and daily counts;
+        the data write lock is held. Returns the object it replaced
+        """
         s_class = cls.__name__
-        def _search(obj):
-            if len(attributes) == 0:
-                return True
+        objs = DATA[s_class]
+        previous = objs.get(obj.id)
+        if previous is None:
+            order = ORDER.get(s_class)
+            if order is not None:
+                bisect.insort(order, obj.id)
+            daily = DAILY.get(s_class)
+            if daily is not None:
+                day = obj._created_day()
+                daily[day] = daily.get(day, 0) + 1
+        objs[obj.id] = obj
+        for index in cls._indexes().values():
+            index.add(obj)
+        return previous
+
+    def _pop(self, cls, obj_id: str) -> Optional[Base]:
+        """ Remove an object from DATA, its indexes, sorted IDs and daily
+        counts; the data write lock is held. Returns it, None if absent
+        """
+        s_class = cls.__name__
+        stored = DATA[s_class].pop(obj_id, None)
+        if stored is None:
+            return None
+        daily = DAILY.get(s_class)
+        if daily is not None:
+            day = stored._created_day()
+            count = daily.get(day, 0) - 1
+            if count > 0:
+                daily[day] = count
+            else:
+                daily.pop(day, None)
+        order = ORDER.get(s_class)
+        if order is not None:
+            i = bisect.bisect_left(order, obj_id)
+            if i < len(order) and order[i] == obj_id:
+                del order[i]
+        for index in cls._indexes().values():
+            index.discard(obj_id)
+        return stored
+
+    def _rollback(self, cls, saved: List[tuple], removed: List[Base]):
+        """ Undo the DATA changes of a write whose persistence failed;
+        the data write lock is held. Changes made since by other writes
+        are kept. Attributes changed in place on a stored object before
+        its save can't be undone
+        """
+        objs = DATA[cls.__name__]
+        for obj, previous in reversed(saved):
+            if objs.get(obj.id) is not obj:
+                continue
+            if previous is None:
+                self._pop(cls, obj.id)
+            elif previous is not obj:
+                self._put(cls, previous)
+        for stored in removed:
+            if stored.id not in objs:
+                self._put(cls, stored)
+
+    def write_many(self, cls, saves: List[Base], removes: List[Base],
+                   durable: bool = False) -> list:
+        """ Store saves and delete removes under one lock, persisted by
+        a single write. Returns, per object of saves, None or the
+        ValueError that kept it out. If persisting raises, the changes
+        to DATA are rolled back before the error propagates
+        """
+        s_class = cls.__name__
+        _wait_loaded(s_class)
+        results, records, saved, removed = [], [], [], []
+        lock = _data_lock(s_class)
+        with lock.write():
+            indexes = cls._indexes().values()
+            now = datetime.utcnow()
+            try:
+                for obj in saves:
+                    try:
+                        for index in indexes:
+                            index.check(obj)
+                    except ValueError as e:
+                        results.append(e)
+                        continue
+                    obj.updated_at = now
+                    saved.append((obj, self._put(cls, obj)))
+                    results.append(None)
+                    records.append({"op": "save", "id": obj.id,
+                                    "obj": obj.to_json(True)})
+                for obj in removes:
+                    stored = self._pop(cls, obj.id)
+                    if stored is None:
+                        continue
+                    removed.append(stored)
+                    records.append({"op": "remove", "id": obj.id})
+                due = cls._log_write(records, durable) if records else False
+            except BaseException:
+                self._rollback(cls, saved, removed)
+                raise
+        if records:
+            try:
+                cls._after_write(due, durable)
+            except BaseException:
+                with lock.write():
+                    self._rollback(cls, saved, removed)
+                raise
+        if saved:
+            notify("save", cls, [obj for obj, _ in saved])
+        if removed:
+            notify("remove", cls, removed)
+        return results
+
+    def compare_and_set(self, cls, id: str, attribute: str, expected,
+                        value) -> bool:
+        """ Set attribute of the stored object id to value if it still
+        equals expected, see Base.compare_and_set
+        The attribute is set back to expected if persisting raises
+        """
+        s_class = cls.__name__
+        _wait_loaded(s_class)
+        lock = _data_lock(s_class)
+        index = cls._indexes().get(attribute)
+
+        def undo():
+            if getattr(obj, attribute) == value:
+                setattr(obj, attribute, expected)
+                if index is not None:
+                    index.add(obj)
+
+        with lock.write():
+            obj = DATA[s_class].get(id)
+            if obj is None or getattr(obj, attribute) != expected:
+                return False
+            setattr(obj, attribute, value)
+            try:
+                if index is not None:
+                    index.check(obj)
+                    index.add(obj)
+                obj.updated_at = datetime.utcnow()
+                due = cls._log_write([
+                    {"op": "save", "id": obj.id, "obj": obj.to_json(True)}])
+            except BaseException:
+                undo()
+                raise
+        try:
+            cls._after_write(due, False)
+        except BaseException:
+            with lock.write():
+                undo()
+            raise
+        notify("save", cls, [obj])
+        return True
+
+    def count(self, cls) -> int:
+        """ Number of objects of cls
+        """
+        s_class = cls.__name__
+        _wait_loaded(s_class)
+        with _data_lock(s_class).read():
+            return len(DATA[s_class].keys())
+
+    def get(self, cls, id: str) -> Optional[Base]:
+        """ Object of cls by ID
+        """
+        s_class = cls.__name__
+        _wait_loaded(s_class)
+        with _data_lock(s_class).read():
+            return DATA[s_class].get(id)
+
+    def search(self, cls, attributes: dict) -> List[Base]:
+        """ Objects of cls with matching attributes
+        Uses a secondary index when one covers a queried attribute
+        """
+        s_class = cls.__name__
+        _wait_loaded(s_class)
+        with _data_lock(s_class).read():
+            candidates = DATA[s_class].values()
+            indexes = cls._indexes()
             for k, v in attributes.items():
-                if (getattr(obj, k) != v):
-                    return False
-            return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+                if k in indexes:
+                    found = indexes[k].lookup(v)
+                    if found is not None:
+                        candidates = found
+                        break
+            return [obj for obj in candidates
+                    if match_attributes(obj, attributes)]
+
+    def page(self, cls, limit: int = None, after: str = None,
+             offset: int = 0) -> List[Base]:
+        """ Objects of cls ordered by ID, see Base.page
+        The sorted IDs are built on first use and kept up to date by
+        save and remove, so a page costs a bisect and a slice
+        """
+        s_class = cls.__name__
+        _wait_loaded(s_class)
+        with _data_lock(s_class).read():
+            objs = DATA[s_class]
+            order = ORDER.get(s_class)
+            if order is None:
+                order = ORDER[s_class] = sorted(objs)
+            start = offset
+            if after is not None:
+                start += bisect.bisect_right(order, after)
+            end = None if limit is None else start + limit
+            return [objs[obj_id] for obj_id in order[start:end]]
+
+    def created_per_day(self, cls) -> Dict[str, int]:
+        """ Number of objects of cls by creation day
+        Counted once on first use, then kept up to date by save and
+        remove like the indexes
+        """
+        s_class = cls.__name__
+        _wait_loaded(s_class)
+        with _data_lock(s_class).read():
+            daily = DAILY.get(s_class)
+            if daily is None:
+                daily = {}
+                for obj in DATA[s_class].values():
+                    day = obj._created_day()
+                    daily[day] = daily.get(day, 0) + 1
+                DAILY[s_class] = daily
+            return dict(daily)
+
+
+STORAGES = {}
+
+
+def get_storage(name: str):
+    """ Shared storage backend by name: "file" (default) or "sqlite"
+    """
+    with _locks_lock:
+        storage = STORAGES.get(name)
+        if storage is None:
+            if name == "file":
+                storage = FileStorage()
+            elif name == "sqlite":
+                from models.sqlite_storage import SQLiteStorage
+                storage = SQLiteStorage(getenv("SQLITE_DB_PATH",
+                                               ".db.sqlite3"))
+            else:
+                raise ValueError("Unknown storage backend {}".format(name))
+            STORAGES[name] = storage
+        return storage
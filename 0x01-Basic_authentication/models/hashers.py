@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+""" Password hashers module
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, TypeVar
+import base64
+import hashlib
+import hmac
+import os
+import threading
+
+
+class Sha256Hasher():
+    """ Unsalted SHA256 hex digests (legacy format)
+    """
+    name = "sha256"
+
+    def identify(self, hashed: str) -> bool:
+        """ Tell whether a stored hash is a SHA256 hex digest
+        """
+        if len(hashed) != 64:
+            return False
+        try:
+            int(hashed, 16)
+        except ValueError:
+            return False
+        return True
+
+    def hash(self, pwd: str) -> str:
+        """ Hash a password
+        """
+        return hashlib.sha256(pwd.encode()).hexdigest().lower()
+
+    def verify(self, pwd: str, hashed: str) -> bool:
+        """ Check a password against a SHA256 hex digest
+        """
+        return hmac.compare_digest(self.hash(pwd), hashed.lower())
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """ SHA256 has no cost parameter
+        """
+        return False
+
+
+class Pbkdf2Hasher():
+    """ Salted PBKDF2-SHA256: pbkdf2_sha256$iterations$salt$hash
+    """
+    name = "pbkdf2_sha256"
+
+    def iterations(self) -> int:
+        """ Configured iteration count
+        """
+        return int(os.getenv("PASSWORD_ITERATIONS", "600000"))
+
+    def identify(self, hashed: str) -> bool:
+        """ Tell whether a stored hash is a PBKDF2 hash
+        """
+        return hashed.startswith(self.name + "$")
+
+    def _derive(self, pwd: str, salt: bytes, iterations: int) -> str:
+        """ Derive the base64 key
+        """
+        key = hashlib.pbkdf2_hmac("sha256", pwd.encode(), salt, iterations)
+        return base64.b64encode(key).decode()
+
+    def hash(self, pwd: str) -> str:
+        """ Hash a password with a random salt
+        """
+        salt = os.urandom(16)
+        iterations = self.iterations()
+        return "$".join([self.name, str(iterations),
+                         base64.b64encode(salt).decode(),
+                         self._derive(pwd, salt, iterations)])
+
+    def verify(self, pwd: str, hashed: str) -> bool:
+        """ Check a password against a PBKDF2 hash
+        """
+        try:
+            _, iterations, salt, key = hashed.split("$")
+            derived = self._derive(pwd, base64.b64decode(salt),
+                                   int(iterations))
+        except ValueError:
+            return False
+        return hmac.compare_digest(derived, key)
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """ Tell whether the iteration count differs from the target
+        """
+        try:
+            return int(hashed.split("$")[1]) != self.iterations()
+        except (IndexError, ValueError):
+            return True
+
+
+class WerkzeugHasher():
+    """ Hashes made by werkzeug.security.generate_password_hash
+    """
+    name = "werkzeug"
+
+    def identify(self, hashed: str) -> bool:
+        """ Tell whether a stored hash is a werkzeug hash
+        """
+        method = hashed.split("$", 1)[0]
+        return "$" in hashed and \
+            method.split(":", 1)[0] in ("pbkdf2", "scrypt")
+
+    def hash(self, pwd: str) -> str:
+        """ Hash a password with werkzeug defaults
+        """
+        from werkzeug.security import generate_password_hash
+        return generate_password_hash(pwd)
+
+    def verify(self, pwd: str, hashed: str) -> bool:
+        """ Check a password with werkzeug
+        """
+        from werkzeug.security import check_password_hash
+        return check_password_hash(hashed, pwd)
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """ Werkzeug hashes are only kept when they are the target
+        """
+        return False
+
+
+class BcryptHasher():
+    """ Bcrypt hashes, when the bcrypt package is installed
+    """
+    name = "bcrypt"
+
+    def rounds(self) -> int:
+        """ Configured bcrypt cost
+        """
+        return int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+    def identify(self, hashed: str) -> bool:
+        """ Tell whether a stored hash is a bcrypt hash
+        """
+        return hashed[:4] in ("$2a$", "$2b$", "$2y$")
+
+    def hash(self, pwd: str) -> str:
+        """ Hash a password at the configured cost
+        """
+        import bcrypt
+        return bcrypt.hashpw(pwd.encode(),
+                             bcrypt.gensalt(self.rounds())).decode()
+
+    def verify(self, pwd: str, hashed: str) -> bool:
+        """ Check a password against a bcrypt hash
+        """
+        import bcrypt
+        return bcrypt.checkpw(pwd.encode(), hashed.encode())
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """ Tell whether the cost differs from the target
+        """
+        try:
+            return int(hashed[4:6]) != self.rounds()
+        except ValueError:
+            return True
+
+
+HASHERS = {}
+_executor = ThreadPoolExecutor(max_workers=1)
+_rehashing = set()
+_rehashing_lock = threading.Lock()
+
+
+def register(hasher) -> None:
+    """ Add a hasher to the registry
+    """
+    HASHERS[hasher.name] = hasher
+
+
+for _hasher in (Sha256Hasher(), Pbkdf2Hasher(), WerkzeugHasher(),
+                BcryptHasher()):
+    register(_hasher)
+
+
+def target():
+    """ Hasher used for new passwords, selected by PASSWORD_HASHER
+    """
+    return HASHERS[os.getenv("PASSWORD_HASHER", Sha256Hasher.name)]
+
+
+def identify(hashed: str):
+    """ Registered hasher that recognizes a stored hash, or None
+    """
+    if hashed is None:
+        return None
+    for hasher in HASHERS.values():
+        if hasher.identify(hashed):
+            return hasher
+    return None
+
+
+def make_password(pwd: str) -> str:
+    """ Hash a password with the target hasher
+    """
+    return target().hash(pwd)
+
+
+def make_passwords(pwds: List[str], workers: int = None) -> List[str]:
+    """ Hash several passwords with the target hasher
+    Slow hashers release the GIL, so they run on a thread pool of
+    workers threads (HASH_WORKERS, default one per CPU)
+    """
+    hasher = target()
+    if len(pwds) < 2 or isinstance(hasher, Sha256Hasher):
+        return [hasher.hash(pwd) for pwd in pwds]
+    workers = workers or int(os.getenv("HASH_WORKERS", "0")) or \
+        os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=min(workers, len(pwds))) as pool:
+        return list(pool.map(hasher.hash, pwds))
+
+
+def check_password(pwd: str, hashed: str) -> bool:
+    """ Check a password with the hasher that made the stored hash
+    """
+    hasher = identify(hashed)
+    if hasher is None:
+        return False
+    try:
+        return hasher.verify(pwd, hashed)
+    except ImportError:
+        return False
+
+
+def needs_rehash(hashed: str) -> bool:
+    """ Tell whether a stored hash differs from the target settings
+    Never when the target is the unsalted SHA256: a salted hash isn't
+    downgraded to it
+    """
+    hasher = target()
+    if isinstance(hasher, Sha256Hasher):
+        return False
+    if identify(hashed) is not hasher:
+        return True
+    return hasher.needs_rehash(hashed)
+
+
+def _rehash(cls, user_id: str, old_hash: str, pwd: str) -> bool:
+    """ Replace the stored hash unless the password changed meanwhile
+    The stored user is checked before hashing, and the new hash is only
+    written if the stored one is still old_hash
+    """
+    try:
+        stored = cls.get(user_id)
+        if stored is None or stored._password != old_hash:
+            return False
+        return cls.compare_and_set(user_id, "_password", old_hash,
+                                   make_password(pwd))
+    finally:
+        with _rehashing_lock:
+            _rehashing.discard(user_id)
+
+
+def schedule_rehash(obj: TypeVar('User'), pwd: str):
+    """ Rehash a password to the target settings in the background
+    At most one rehash per user is pending; returns None when one is
+    """
+    with _rehashing_lock:
+        if obj.id in _rehashing:
+            return None
+        _rehashing.add(obj.id)
+    try:
+        return _executor.submit(_rehash, type(obj), obj.id, obj._password,
+                                pwd)
+    except BaseException:
+        with _rehashing_lock:
+            _rehashing.discard(obj.id)
+        raise
@@ -1,13 +1,15 @@
 #!/usr/bin/env python3
 """ User module
 """
-import hashlib
+from models import hashers
 from models.base import Base
 
 
 class User(Base):
     """ User class
     """
+    __slots__ = ("email", "_password", "first_name", "last_name")
+    indexed_attributes = {'email': False}
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a User instance
@@ -26,12 +28,13 @@ class User(Base):
 
     @password.setter
     def password(self, pwd: str):
-        """ Setter of a new password: encrypt in SHA256
+        """ Setter of a new password: hashed with the target hasher
+        (SHA256 unless PASSWORD_HASHER says otherwise)
         """
         if pwd is None or type(pwd) is not str:
             self._password = None
         else:
-            self._password = hashlib.sha256(pwd.encode()).hexdigest().lower()
+            self._password = hashers.make_password(pwd)
 
     def is_valid_password(self, pwd: str) -> bool:
         """ Validate a password
@@ -40,8 +43,11 @@ class User(Base):
             return False
         if self.password is None:
             return False
-        pwd_e = pwd.encode()
-        return hashlib.sha256(pwd_e).hexdigest().lower() == self.password
+        if not hashers.check_password(pwd, self.password):
+            return False
+        if hashers.needs_rehash(self.password):
+            hashers.schedule_rehash(self, pwd)
+        return True
 
     def display_name(self) -> str:
         """ Display User name based on email/first_name/last_name
@@ -5,6 +5,7 @@ Route module main app
 
 from os import getenv
 from api.v1.views import app_views
+from api.v1.auth.auth import PathMatcher
 from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS, cross_origin)
 import os
@@ -15,6 +16,10 @@ app.register_blueprint(app_views)
 CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
 
 auth = None
+EXCLUDED_PATHS = PathMatcher([
+    '/api/v1/status/',
+    '/api/v1/unauthorized/',
+    '/api/v1/forbidden/'])
 
 if os.getenv('AUTH_TYPE') == 'auth':
     from api.v1.auth.auth import Auth
@@ -45,13 +50,8 @@ def forbidden_error(error) -> str:
 @app.before_request
 def before_request() -> str:
     """ checks request """
-    request_path_list = [
-        '/api/v1/status/',
-        '/api/v1/unauthorized/',
-        '/api/v1/forbidden/']
-
     if auth:
-        if auth.require_auth(request.path, request_path_list):
+        if auth.require_auth(request.path, EXCLUDED_PATHS):
             if auth.authorization_header(request) is None:
                 abort(401)
             if auth.current_user(request) is None:
@@ -2,22 +2,77 @@
 """ API authentication
 """
 from flask import request
-from typing import List, TypeVar
+from functools import lru_cache
+from typing import List, TypeVar, Union
+import re
+
+_EXACT = None
+_PREFIX = object()
+
+
+class PathMatcher():
+    """ Compiled set of excluded paths: exact paths, and prefixes for
+    entries ending with '*' (any other '*' is a literal character).
+    The entries are merged into a trie, whose end markers are not
+    strings so they can't collide with a path character, and which
+    is compiled to a regex whose alternatives never share a first
+    character, so a lookup is a single pass over the path.
+    """
+    def __init__(self, excluded_paths: List[str]):
+        """ compile the excluded paths"""
+        self.excluded_paths = list(excluded_paths)
+        trie = {}
+        for entry in self.excluded_paths:
+            prefix = entry.endswith('*')
+            node = trie
+            for char in entry[:-1] if prefix else entry:
+                node = node.setdefault(char, {})
+            node[_PREFIX if prefix else _EXACT] = True
+        self._regex = re.compile(self._pattern(trie)) if trie else None
+
+    @classmethod
+    def _pattern(cls, node: dict) -> str:
+        """ regex of a trie node"""
+        if node.get(_PREFIX):
+            return ''
+        alternatives = [r'\Z'] if node.get(_EXACT) else []
+        for char, child in node.items():
+            if char is not _EXACT and char is not _PREFIX:
+                alternatives.append(re.escape(char) + cls._pattern(child))
+        if len(alternatives) == 1:
+            return alternatives[0]
+        return '(?:' + '|'.join(alternatives) + ')'
+
+    def __len__(self) -> int:
+        """ number of excluded paths"""
+        return len(self.excluded_paths)
+
+    def match(self, path: str) -> bool:
+        """ tell whether a path (slash-terminated) is excluded"""
+        return self._regex is not None and \
+            self._regex.match(path) is not None
+
+
+@lru_cache(maxsize=32)
+def _compile(excluded_paths: tuple) -> PathMatcher:
+    """ matcher of a list of excluded paths"""
+    return PathMatcher(excluded_paths)
 
 
 class Auth():
     """ manages the API authentication"""
-    def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
-        """ require authorithation check"""
+    def require_auth(self, path: str,
+                     excluded_paths: Union[List[str], PathMatcher]) -> bool:
+        """ require authorithation check
+        excluded_paths is best a PathMatcher built once; a list is
+        compiled on first use and the matcher cached"""
         if path is None or excluded_paths is None or not len(excluded_paths):
             return True
+        if not isinstance(excluded_paths, PathMatcher):
+            excluded_paths = _compile(tuple(excluded_paths))
         if path[-1] != '/':
             path += '/'
-        for i in excluded_paths:
-            if i.endswith('*'):
-                if path.startswith(i[:1]):
-                    return False
-        return False if path in excluded_paths else True
+        return not excluded_paths.match(path)
 
     def authorization_header(self, request=None) -> str:
         """ authorization header check"""
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Cache of the users resolved from Authorization headers"""
+from collections import OrderedDict
+from typing import TypeVar
+from models.base import add_listener
+from models.user import User
+import hashlib
+import hmac
+import os
+import threading
+import time
+
+
+class PrincipalCache():
+    """LRU cache with a TTL: keyed hash of an Authorization header -> User ID
+
+    Headers are stored as an HMAC under a per-process random key, never in
+    clear. The entries of a user are dropped when it is saved or removed,
+    and all entries when users are reloaded. Each entry also keeps the
+    stored password hash and email it was resolved with: a hit reloads the
+    user and is a miss when they changed, so writes made by another worker
+    process to a shared store (SQLite) apply at once, not after the TTL.
+    """
+
+    def __init__(self, max_size: int = None, ttl: float = None):
+        """Initializes an empty cache
+        max_size (AUTH_CACHE_SIZE, 0 disables it) and ttl in seconds
+        (AUTH_CACHE_TTL) default to the environment"""
+        if max_size is None:
+            max_size = int(os.getenv('AUTH_CACHE_SIZE', '1024'))
+        if ttl is None:
+            ttl = float(os.getenv('AUTH_CACHE_TTL', '60'))
+        self.max_size = max_size
+        self.ttl = ttl
+        self._key = os.urandom(32)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._by_user = {}
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _digest(self, header: str) -> bytes:
+        """Return the keyed hash of a header"""
+        return hmac.new(self._key, header.encode('utf-8', 'surrogateescape'),
+                        hashlib.sha256).digest()
+
+    def _drop(self, digest: bytes):
+        """Remove one entry; the lock is held"""
+        user_id = self._entries.pop(digest)[0]
+        digests = self._by_user.get(user_id)
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._by_user[user_id]
+
+    def get(self, header: str) -> TypeVar('User'):
+        """Return the cached User of a header, None on a miss"""
+        if not self.max_size or not isinstance(header, str):
+            return None
+        digest = self._digest(header)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or entry[3] <= time.monotonic():
+                if entry is not None:
+                    self._drop(digest)
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+        user = User.get(entry[0])
+        if user is not None and (user._password != entry[1] or
+                                 user.email != entry[2]):
+            user = None
+        with self._lock:
+            if user is None:
+                if self._entries.get(digest) is entry:
+                    self._drop(digest)
+                self.misses += 1
+            else:
+                self.hits += 1
+        return user
+
+    def put(self, header: str, user: TypeVar('User'), generation: int):
+        """Cache the User a header resolved to
+        generation is the value read before resolving it: if users changed
+        meanwhile the result may be stale and isn't cached"""
+        if not self.max_size or not isinstance(header, str) or user is None:
+            return
+        digest = self._digest(header)
+        with self._lock:
+            if generation != self.generation:
+                return
+            if digest in self._entries:
+                self._drop(digest)
+            self._entries[digest] = (user.id, user._password, user.email,
+                                     time.monotonic() + self.ttl)
+            self._by_user.setdefault(user.id, set()).add(digest)
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, user_ids=None):
+        """Drop the entries of some users, or all entries"""
+        with self._lock:
+            self.generation += 1
+            if user_ids is None:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                self._by_user.clear()
+                return
+            for user_id in user_ids:
+                for digest in list(self._by_user.get(user_id, ())):
+                    self._drop(digest)
+                    self.invalidations += 1
+
+    def on_write(self, event: str, cls, objs: list):
+        """Model listener: invalidate on writes of users"""
+        if not issubclass(cls, User):
+            return
+        if event == 'load':
+            self.invalidate()
+        else:
+            self.invalidate(obj.id for obj in objs)
+
+    def metrics(self) -> dict:
+        """Return the hit/miss counters and the current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'size': len(self._entries),
+            }
+
+
+principal_cache = PrincipalCache()
+add_listener(principal_cache.on_write)
@@ -4,6 +4,7 @@ Session-based authentication with Flask app.
 """
 
 from flask import Flask, request, abort
+from api.v1.auth.session_store import get_session_store
 import os
 import uuid
 
@@ -27,10 +28,17 @@ class Auth:
 class SessionAuth(Auth):
     """
     Session-based authentication class.
-    Stores and retrieves session IDs for users.
+    Stores and retrieves session IDs for users in session_store,
+    configured by SESSION_STORE, SESSION_DURATION and SESSION_MAX_SIZE.
+    user_id_by_session_id is only set with the memory store: it is the
+    store's dict of sessions, for reading. Writing to it bypasses expiry
+    and the size limit, so sessions are created with create_session.
+    With another store it is None, since the sessions are not in this
+    process.
     """
 
-    user_id_by_session_id = {}
+    session_store = get_session_store()
+    user_id_by_session_id = getattr(session_store, 'sessions', None)
 
     def create_session(self, user_id: str = None) -> str:
         """
@@ -40,7 +48,7 @@ class SessionAuth(Auth):
         if user_id is None or not isinstance(user_id, str):
             return None
         session_id = str(uuid.uuid4())
-        self.user_id_by_session_id[session_id] = user_id
+        self.session_store.create(session_id, user_id)
         return session_id
 
     def user_id_for_session_id(self, session_id: str = None) -> str:
@@ -50,7 +58,7 @@ class SessionAuth(Auth):
         """
         if session_id is None or not isinstance(session_id, str):
             return None
-        return self.user_id_by_session_id.get(session_id)
+        return self.session_store.get(session_id)
 
 
 # Flask application setup
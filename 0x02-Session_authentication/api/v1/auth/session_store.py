@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""Session stores: session ID -> user ID, with expiry and a maximum size"""
+from typing import Optional
+import heapq
+import os
+import threading
+import time
+
+
+class MemorySessionStore():
+    """Sessions of this process, kept in the plain dict sessions
+
+    sessions is ordered from least to most recently used: a lookup moves
+    the session to the end, and the first ones are evicted past max_size.
+    Expiry times sit in a heap, swept on each create, so expired sessions
+    don't stay in memory when they are never looked up again.
+    """
+
+    def __init__(self, max_size: int = 0, duration: float = 0):
+        """Initializes an empty store
+        max_size and duration in seconds, 0 for no limit"""
+        self.max_size = max_size
+        self.duration = duration
+        self.sessions = {}
+        self._expires = {}
+        self._heap = []
+        self._lock = threading.Lock()
+
+    def _drop(self, session_id: str):
+        """Remove one session; the lock is held"""
+        self.sessions.pop(session_id, None)
+        self._expires.pop(session_id, None)
+
+    def _sweep(self, now: float):
+        """Remove the expired sessions; the lock is held
+        Heap entries of sessions already removed are skipped, and the heap
+        is rebuilt once they outnumber the live ones"""
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            expires_at, session_id = heapq.heappop(heap)
+            if self._expires.get(session_id) == expires_at:
+                self._drop(session_id)
+        if len(heap) > 2 * len(self._expires) + 64:
+            self._heap = [(expires_at, session_id) for session_id, expires_at
+                          in self._expires.items()]
+            heapq.heapify(self._heap)
+
+    def create(self, session_id: str, user_id: str):
+        """Store a new session"""
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            self._drop(session_id)
+            self.sessions[session_id] = user_id
+            if self.duration > 0:
+                expires_at = now + self.duration
+                self._expires[session_id] = expires_at
+                heapq.heappush(self._heap, (expires_at, session_id))
+            while self.max_size > 0 and len(self.sessions) > self.max_size:
+                self._drop(next(iter(self.sessions)))
+
+    def get(self, session_id: str) -> Optional[str]:
+        """Return the user ID of a live session, None otherwise"""
+        with self._lock:
+            user_id = self.sessions.pop(session_id, None)
+            if user_id is None:
+                return None
+            expires_at = self._expires.get(session_id)
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._drop(session_id)
+                return None
+            self.sessions[session_id] = user_id
+            return user_id
+
+    def delete(self, session_id: str) -> bool:
+        """Remove a session, return whether it existed"""
+        with self._lock:
+            found = session_id in self.sessions
+            self._drop(session_id)
+            return found
+
+    def __len__(self) -> int:
+        """Number of sessions, expired ones not swept yet included"""
+        return len(self.sessions)
+
+
+class SQLiteSessionStore():
+    """Sessions in a SQLite database shared by the worker processes
+
+    Rows hold an expiry time (wall clock, NULL for none) and the last use,
+    refreshed at most once per second per session so lookups rarely write.
+    Expired sessions are swept on create, at most once per second, and the
+    least recently used ones are then deleted past max_size: the size
+    limit may be overrun by the sessions created within a second.
+    """
+
+    def __init__(self, db_path: str, max_size: int = 0,
+                 duration: float = 0):
+        """Initializes the store, creating its table if needed"""
+        from models.sqlite_storage import SQLiteStorage
+        self.max_size = max_size
+        self.duration = duration
+        self.db = SQLiteStorage(db_path)
+        self._next_sweep = 0
+        with self.db.connection() as conn, conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS sessions '
+                         '(session_id TEXT PRIMARY KEY, user_id TEXT, '
+                         'expires_at REAL, last_used REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS sessions_expires_at '
+                         'ON sessions (expires_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS sessions_last_used '
+                         'ON sessions (last_used)')
+
+    def create(self, session_id: str, user_id: str):
+        """Store a new session"""
+        now = time.time()
+        expires_at = now + self.duration if self.duration > 0 else None
+        with self.db.connection() as conn, conn:
+            conn.execute('INSERT OR REPLACE INTO sessions '
+                         '(session_id, user_id, expires_at, last_used) '
+                         'VALUES (?, ?, ?, ?)',
+                         (session_id, user_id, expires_at, now))
+            if now >= self._next_sweep:
+                self._next_sweep = now + 1
+                self._sweep(conn, now)
+
+    def _sweep(self, conn, now: float):
+        """Delete the expired sessions, then the least recently used ones
+        past max_size; runs in the transaction of conn"""
+        conn.execute('DELETE FROM sessions WHERE expires_at <= ?', (now,))
+        if self.max_size > 0:
+            count = conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+            if count > self.max_size:
+                conn.execute('DELETE FROM sessions WHERE session_id IN '
+                             '(SELECT session_id FROM sessions '
+                             'ORDER BY last_used LIMIT ?)',
+                             (count - self.max_size,))
+
+    def get(self, session_id: str) -> Optional[str]:
+        """Return the user ID of a live session, None otherwise"""
+        now = time.time()
+        with self.db.connection() as conn:
+            row = conn.execute('SELECT user_id, expires_at, last_used '
+                               'FROM sessions WHERE session_id = ?',
+                               (session_id,)).fetchone()
+            if row is None:
+                return None
+            user_id, expires_at, last_used = row
+            if expires_at is not None and expires_at <= now:
+                with conn:
+                    conn.execute('DELETE FROM sessions WHERE session_id = ? '
+                                 'AND expires_at <= ?', (session_id, now))
+                return None
+            if now - last_used >= 1:
+                with conn:
+                    conn.execute('UPDATE sessions SET last_used = ? '
+                                 'WHERE session_id = ?', (now, session_id))
+            return user_id
+
+    def delete(self, session_id: str) -> bool:
+        """Remove a session, return whether it existed"""
+        with self.db.connection() as conn, conn:
+            return conn.execute('DELETE FROM sessions WHERE session_id = ?',
+                                (session_id,)).rowcount > 0
+
+    def __len__(self) -> int:
+        """Number of sessions, expired ones not swept yet included"""
+        with self.db.connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM sessions'
+                                ).fetchone()[0]
+
+
+def get_session_store():
+    """Store configured by the environment
+    SESSION_STORE: memory (default) or sqlite, in SESSION_DB_PATH
+    SESSION_DURATION: lifetime in seconds, 0 for none (default 86400)
+    SESSION_MAX_SIZE: maximum number of sessions, 0 for none (default
+    100000)"""
+    name = os.getenv('SESSION_STORE', 'memory')
+    max_size = int(os.getenv('SESSION_MAX_SIZE', '100000'))
+    duration = float(os.getenv('SESSION_DURATION', '86400'))
+    if name == 'memory':
+        return MemorySessionStore(max_size, duration)
+    if name == 'sqlite':
+        return SQLiteSessionStore(
+            os.getenv('SESSION_DB_PATH', '.db_sessions.sqlite3'),
+            max_size, duration)
+    raise ValueError("Unknown session store {}".format(name))
@@ -1,8 +1,18 @@
 #!/usr/bin/env python3
 """ index for views
 """
-from flask import jsonify, abort
+from flask import jsonify, abort, request
 from api.v1.views import app_views
+from models.user import User
+import hashlib
+import os
+import threading
+import time
+
+STATS_MODELS = {'users': User}
+STATS_TTL = float(os.getenv('STATS_TTL', '5'))
+_stats_cache = {}
+_stats_lock = threading.Lock()
 
 
 @app_views.route('/status', methods=['GET'], strict_slashes=False)
@@ -13,15 +23,47 @@ def status() -> str:
     return jsonify({"status": "OK"})
 
 
+def _compute_stats(aggregates: bool) -> dict:
+    """
+    Number of each object of STATS_MODELS, and with aggregates the
+    number created per day under <name>_created_per_day
+    """
+    stats = {}
+    for name, model in STATS_MODELS.items():
+        stats[name] = model.count()
+        if aggregates:
+            stats[name + '_created_per_day'] = model.created_per_day()
+    return stats
+
+
+def get_stats(aggregates: bool = False) -> tuple:
+    """
+    Stats and their ETag, computed at most once per STATS_TTL seconds
+    """
+    now = time.monotonic()
+    with _stats_lock:
+        cached = _stats_cache.get(aggregates)
+        if cached is not None and cached[0] > now:
+            return cached[1], cached[2]
+    stats = _compute_stats(aggregates)
+    etag = hashlib.sha1(repr(sorted(stats.items())).encode()).hexdigest()
+    with _stats_lock:
+        _stats_cache[aggregates] = (now + STATS_TTL, stats, etag)
+    return stats, etag
+
+
 @app_views.route('/stats/', strict_slashes=False)
 def stats() -> str:
     """
     JSON response containing the number of each object
+    Query parameter aggregates=1 adds the number created per day.
+    Answers 304 when If-None-Match has the current ETag.
     """
-    from models.user import User
-    stats = {}
-    stats['users'] = User.count()
-    return jsonify(stats)
+    stats, etag = get_stats(request.args.get('aggregates') == '1')
+    response = jsonify(stats)
+    response.set_etag(etag)
+    response.cache_control.max_age = int(STATS_TTL)
+    return response.make_conditional(request)
 
 
 @app_views.route('/unauthorized', methods=['GET'], strict_slashes=False)
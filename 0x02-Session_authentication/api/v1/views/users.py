@@ -1,22 +1,100 @@
 #!/usr/bin/env python3
 """ Module of Users views
 """
+from api.v1.auth.principal_cache import principal_cache
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import Response, abort, jsonify, request, url_for
+from models import hashers
 from models.user import User
-from werkzeug.security import generate_password_hash, check_password_hash
 import base64
+import json
+
+PAGE_MAX = 1000
+STREAM_BATCH = 500
+BATCH_MAX = 10000
+
+
+def _user_json(user: User, fields: list = None) -> dict:
+    """ JSON representation of a user, limited to fields if given
+    """
+    user_json = user.to_json()
+    if fields is None:
+        return user_json
+    return {k: user_json[k] for k in fields if k in user_json}
+
+
+def _int_arg(name: str, default: int = None, minimum: int = 0) -> int:
+    """ Integer query parameter, ValueError if invalid
+    """
+    value = request.args.get(name)
+    if value is None or value == '':
+        return default
+    value = int(value)
+    if value < minimum:
+        raise ValueError(name)
+    return value
+
+
+def _stream_users(after: str, offset: int, fields: list):
+    """ JSON array of users from after/offset on, written one at a time
+    and read STREAM_BATCH users at a time
+    """
+    separator = '['
+    while True:
+        users = User.page(STREAM_BATCH, after, offset)
+        offset = 0
+        for user in users:
+            yield separator + json.dumps(_user_json(user, fields))
+            separator = ','
+        if len(users) < STREAM_BATCH:
+            break
+        after = users[-1].id
+    yield '[]' if separator == '[' else ']'
+
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters (optional):
+      - limit: page size, at most PAGE_MAX
+      - offset: number of users to skip
+      - cursor: ID of the last user of the previous page
+      - fields: comma-separated attributes to return
+      - stream=1: send every user from cursor/offset on as a streamed
+        JSON array, ignoring limit
     Return:
-      - list of all User objects JSON represented
+      - list of User objects JSON represented, ordered by ID when paged;
+        X-Next-Cursor and Link point to the next page if there is one
+      - 400 if limit or offset is invalid
     """
     if not authenticate():
         return jsonify({'error': 'Unauthorized'}), 401
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    try:
+        limit = _int_arg('limit', minimum=1)
+        offset = _int_arg('offset', 0)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit or offset'}), 400
+    cursor = request.args.get('cursor') or None
+    fields = request.args.get('fields')
+    fields = [f for f in fields.split(',') if f] if fields else None
+
+    if request.args.get('stream') == '1':
+        return Response(_stream_users(cursor, offset, fields),
+                        mimetype='application/json')
+    if limit is None and offset == 0 and cursor is None:
+        return jsonify([_user_json(user, fields) for user in User.all()])
+
+    limit = min(limit or PAGE_MAX, PAGE_MAX)
+    users = User.page(limit + 1, cursor, offset)
+    response = jsonify([_user_json(user, fields)
+                        for user in users[:limit]])
+    if len(users) > limit:
+        next_cursor = users[limit - 1].id
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = '<{}>; rel="next"'.format(url_for(
+            'app_views.view_all_users', cursor=next_cursor, limit=limit,
+            fields=request.args.get('fields')))
+    return response
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -89,13 +167,10 @@ def create_user() -> str:
         error_msg = 'password missing'
     else:
         try:
-            # Password hashing
-            hashed_password = generate_password_hash(password)
-
             if error_msg is None:
                 user = User()
                 user.email = email
-                user.password = hashed_password
+                user.password = password
                 user.first_name = rj.get('first_name')
                 user.last_name = rj.get('last_name')
                 user.save()
@@ -148,11 +223,102 @@ def update_user(user_id: str = None) -> str:
         return jsonify({'error': f"Can't update User: {str(e)}"}), 400
 
 
+@app_views.route('/users/batch', methods=['POST'], strict_slashes=False)
+def batch_users() -> str:
+    """ POST /api/v1/users/batch
+    JSON body, every list optional:
+      - create: list of {email, password, first_name, last_name}
+      - update: list of {id, first_name, last_name}
+      - delete: list of User IDs
+    Items are validated one by one, passwords are hashed in parallel and
+    all changes are persisted with a single write.
+    Return:
+      - per list, the result of each item in order: the User JSON
+        represented with status 201/200, {"id": ..., "status": 200} for
+        deletes, or {"error": ..., "status": 400/404}
+      - 400 if the body isn't a JSON object of lists or has more than
+        BATCH_MAX items
+    """
+    if not authenticate():
+        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        rj = request.get_json()
+    except Exception:
+        rj = None
+    if not isinstance(rj, dict):
+        return jsonify({'error': 'Wrong format'}), 400
+    items = {}
+    for key in ('create', 'update', 'delete'):
+        items[key] = rj.get(key) or []
+        if not isinstance(items[key], list):
+            return jsonify({'error': 'Wrong format'}), 400
+    if sum(len(batch) for batch in items.values()) > BATCH_MAX:
+        return jsonify({'error': 'Too many items'}), 400
+
+    results = {'create': [], 'update': [], 'delete': []}
+    saves, passwords, removes = [], [], []
+    for item in items['create']:
+        error_msg = None
+        if not isinstance(item, dict):
+            error_msg = 'Wrong format'
+        elif not item.get('email') or type(item.get('email')) is not str:
+            error_msg = 'email missing'
+        elif not item.get('password') or \
+                type(item.get('password')) is not str:
+            error_msg = 'password missing'
+        if error_msg is not None:
+            results['create'].append({'error': error_msg, 'status': 400})
+            continue
+        user = User(email=item['email'], first_name=item.get('first_name'),
+                    last_name=item.get('last_name'))
+        saves.append(user)
+        passwords.append(item['password'])
+        results['create'].append(user)
+    for user, hashed in zip(saves, hashers.make_passwords(passwords)):
+        user._password = hashed
+
+    for item in items['update']:
+        user_id = item.get('id') if isinstance(item, dict) else None
+        user = User.get(user_id) if isinstance(user_id, str) else None
+        if user is None:
+            results['update'].append({'error': 'Not found', 'status': 404})
+            continue
+        if item.get('first_name') is not None:
+            user.first_name = item.get('first_name')
+        if item.get('last_name') is not None:
+            user.last_name = item.get('last_name')
+        saves.append(user)
+        results['update'].append(user)
+
+    for user_id in items['delete']:
+        user = User.get(user_id) if isinstance(user_id, str) else None
+        if user is None:
+            results['delete'].append({'error': 'Not found', 'status': 404})
+            continue
+        removes.append(user)
+        results['delete'].append({'id': user_id, 'status': 200})
+
+    errors = dict(zip((id(user) for user in saves),
+                      User.write_many(saves, removes)))
+    for key, status in (('create', 201), ('update', 200)):
+        for i, result in enumerate(results[key]):
+            if isinstance(result, User):
+                error = errors[id(result)]
+                if error is None:
+                    results[key][i] = dict(result.to_json(), status=status)
+                else:
+                    results[key][i] = {'error': str(error), 'status': 400}
+    return jsonify(results), 200
+
+
 def authenticate() -> bool:
     """ Basic Authentication function """
     auth = request.headers.get('Authorization')
     if not auth:
         return False
+    if principal_cache.get(auth) is not None:
+        return True
+    generation = principal_cache.generation
 
     try:
         auth_type, auth_string = auth.split(' ')
@@ -163,9 +329,8 @@ def authenticate() -> bool:
     except (ValueError, TypeError):
         return False
 
-    # Here we would match against your user database, example:
-    user = User.query.filter_by(email=email).first()
-    if user and check_password_hash(user.password, password):
-        return True
+    for user in User.search({'email': email}):
+        if user.is_valid_password(password):
+            principal_cache.put(auth, user, generation)
+            return True
     return False
-
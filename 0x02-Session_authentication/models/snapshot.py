@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+""" Binary snapshot format of the model store
+
+Columnar layout, all integers little-endian:
+  MAGIC, uint32 row count, uint16 column count, then per column:
+  uint16 length + UTF-8 name, the type tag of every row (one byte each),
+  and three length-prefixed pools holding the non-constant values:
+  int64 values (integers and epoch-second timestamps), float64 values,
+  and the UTF-8 text of strings with their uint32 lengths in characters
+  (lone surrogates, which JSON allows, are kept with "surrogatepass").
+Each pool is decoded with a single call, so loading doesn't walk the
+file field by field.
+"""
+from array import array
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import BinaryIO, Iterable, Iterator
+import argparse
+import json
+import struct
+import sys
+
+
+MAGIC = b"HBSNAP2\n"
+EPOCH = datetime(1970, 1, 1)
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+TIMESTAMP_FIELDS = ("created_at", "updated_at")
+
+MISSING, NONE, STR, INT, FLOAT, TRUE, FALSE, TIMESTAMP, JSON = range(9)
+_CONSTANTS = {NONE: None, TRUE: True, FALSE: False}
+_ABSENT = object()
+
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_SWAP = sys.byteorder != "little"
+
+
+def _epoch(value: datetime) -> int:
+    """ Whole seconds since the epoch of a naive UTC datetime
+    """
+    return (value - EPOCH) // timedelta(seconds=1)
+
+
+def _pack(values: array) -> bytes:
+    """ Length-prefixed little-endian bytes of an array
+    """
+    if _SWAP:
+        values.byteswap()
+    data = values.tobytes()
+    return _U32.pack(len(data)) + data
+
+
+def _unpack(typecode: str, data: bytes) -> array:
+    """ Array of a pool written by _pack
+    """
+    values = array(typecode)
+    values.frombytes(data)
+    if _SWAP:
+        values.byteswap()
+    return values
+
+
+def _encode_column(name: str, records: list, timestamp: bool) -> bytes:
+    """ Tags and value pools of one column
+    """
+    tags = bytearray()
+    ints = array("q")
+    floats = array("d")
+    lengths = array("I")
+    texts = []
+    for record in records:
+        value = record.get(name, _ABSENT)
+        if value is _ABSENT:
+            tags.append(MISSING)
+        elif value is None:
+            tags.append(NONE)
+        elif value is True:
+            tags.append(TRUE)
+        elif value is False:
+            tags.append(FALSE)
+        elif type(value) is datetime:
+            tags.append(TIMESTAMP)
+            ints.append(_epoch(value))
+        elif type(value) is str:
+            if timestamp:
+                try:
+                    stamp = datetime.strptime(value, TIMESTAMP_FORMAT)
+                    tags.append(TIMESTAMP)
+                    ints.append(_epoch(stamp))
+                    continue
+                except ValueError:
+                    pass
+            tags.append(STR)
+            lengths.append(len(value))
+            texts.append(value)
+        elif type(value) is int and -(1 << 63) <= value < (1 << 63):
+            tags.append(INT)
+            ints.append(value)
+        elif type(value) is float:
+            tags.append(FLOAT)
+            floats.append(value)
+        else:
+            text = json.dumps(value)
+            tags.append(JSON)
+            lengths.append(len(text))
+            texts.append(text)
+    data = name.encode()
+    text = "".join(texts).encode("utf-8", "surrogatepass")
+    return b"".join([_U16.pack(len(data)), data, bytes(tags),
+                     _pack(ints), _pack(floats), _pack(lengths),
+                     _U32.pack(len(text)), text])
+
+
+def dump(records: Iterable[dict], f: BinaryIO,
+         timestamps: Iterable[str] = TIMESTAMP_FIELDS):
+    """ Write records (field name -> value) to a binary file
+    String values of timestamps fields are stored as timestamps
+    """
+    records = list(records)
+    names = {}
+    for record in records:
+        for name in record:
+            names[name] = True
+    f.write(MAGIC + _U32.pack(len(records)) + _U16.pack(len(names)))
+    for name in names:
+        f.write(_encode_column(name, records, name in timestamps))
+
+
+class _Reader():
+    """ Sequential reader over a bytes buffer
+    """
+
+    def __init__(self, data: bytes):
+        """ Start at the beginning of data
+        """
+        self.data = memoryview(data)
+        self.pos = 0
+
+    def take(self, size: int) -> memoryview:
+        """ Next size bytes
+        """
+        if self.pos + size > len(self.data):
+            raise ValueError("Truncated snapshot")
+        chunk = self.data[self.pos:self.pos + size]
+        self.pos += size
+        return chunk
+
+    def sized(self) -> memoryview:
+        """ Next uint32 length-prefixed chunk
+        """
+        return self.take(_U32.unpack(self.take(4))[0])
+
+
+def _decode_column(reader: _Reader, rows: int) -> tuple:
+    """ Name and row values of one column
+    """
+    name = bytes(reader.take(_U16.unpack(reader.take(2))[0])).decode()
+    tags = bytes(reader.take(rows))
+    ints = _unpack("q", reader.sized())
+    floats = _unpack("d", reader.sized())
+    lengths = _unpack("I", reader.sized())
+    text = str(reader.sized(), "utf-8", "surrogatepass")
+    ends = list(accumulate(lengths))
+    strings = [text[end - length:end] for end, length in zip(ends, lengths)]
+
+    tag = tags[0] if rows else NONE
+    if tags.count(tag) == rows:
+        if tag == STR:
+            return name, strings
+        if tag == TIMESTAMP:
+            return name, [EPOCH + timedelta(seconds=s) for s in ints]
+        if tag in _CONSTANTS:
+            return name, [_CONSTANTS[tag]] * rows
+    ints, floats, strings = iter(ints), iter(floats), iter(strings)
+    values = []
+    for tag in tags:
+        if tag == STR:
+            values.append(next(strings))
+        elif tag == TIMESTAMP:
+            values.append(EPOCH + timedelta(seconds=next(ints)))
+        elif tag in _CONSTANTS:
+            values.append(_CONSTANTS[tag])
+        elif tag == INT:
+            values.append(next(ints))
+        elif tag == FLOAT:
+            values.append(next(floats))
+        elif tag == JSON:
+            values.append(json.loads(next(strings)))
+        elif tag == MISSING:
+            values.append(_ABSENT)
+        else:
+            raise ValueError("Unknown type tag {}".format(tag))
+    return name, values
+
+
+def iter_records(f: BinaryIO) -> Iterator[dict]:
+    """ Yield the records of a binary file
+    The file is read whole: columns only form rows once all are decoded.
+    Timestamps come back as naive UTC datetimes.
+    """
+    reader = _Reader(f.read())
+    if bytes(reader.take(len(MAGIC))) != MAGIC:
+        raise ValueError("Not a binary snapshot")
+    rows = _U32.unpack(reader.take(4))[0]
+    names, columns = [], []
+    for _ in range(_U16.unpack(reader.take(2))[0]):
+        name, values = _decode_column(reader, rows)
+        names.append(name)
+        columns.append(values)
+    sparse = any(_ABSENT in values for values in columns)
+    for row in zip(*columns):
+        if sparse:
+            yield {name: value for name, value in zip(names, row)
+                   if value is not _ABSENT}
+        else:
+            yield dict(zip(names, row))
+
+
+def json_to_binary(src: str, dst: str):
+    """ Convert a .db_<Class>.json snapshot to the binary format
+    """
+    with open(src, 'r') as f:
+        objs_json = json.load(f)
+    with open(dst, 'wb') as f:
+        dump(objs_json.values(), f)
+
+
+def binary_to_json(src: str, dst: str):
+    """ Convert a binary snapshot to the .db_<Class>.json format
+    """
+    objs_json = {}
+    with open(src, 'rb') as f:
+        for record in iter_records(f):
+            for key, value in record.items():
+                if type(value) is datetime:
+                    record[key] = value.strftime(TIMESTAMP_FORMAT)
+            objs_json[record["id"]] = record
+    with open(dst, 'w') as f:
+        json.dump(objs_json, f)
+
+
+def main():
+    """ Command line converter
+    """
+    parser = argparse.ArgumentParser(
+        description="Convert model snapshots between JSON and binary")
+    parser.add_argument("direction", choices=["to-binary", "to-json"])
+    parser.add_argument("src")
+    parser.add_argument("dst")
+    args = parser.parse_args()
+    if args.direction == "to-binary":
+        json_to_binary(args.src, args.dst)
+    else:
+        binary_to_json(args.src, args.dst)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+""" SQLite storage backend
+"""
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, TypeVar
+import json
+import os
+import queue
+import sqlite3
+import threading
+
+from models.base import TIMESTAMP_FORMAT, match_attributes, notify
+
+
+class SQLiteStorage():
+    """ Storage backend sharing one SQLite database between processes
+    Each class has a table of (id, data), data being to_json(True) as
+    JSON. Its indexed_attributes get indexes on json_extract(data, ...),
+    UNIQUE for unique ones. Its number of rows is kept in _counts by
+    triggers. Connections come from a per-process pool.
+    """
+
+    def __init__(self, db_path: str, pool_size: int = None):
+        """ Initialize the backend; connections are opened on demand
+        """
+        self.db_path = os.path.abspath(db_path)
+        self.pool_size = pool_size or int(os.getenv("SQLITE_POOL_SIZE",
+                                                    "5"))
+        self._lock = threading.Lock()
+        self._pid = None
+        self._pool = None
+        self._opened = 0
+        self._tables = set()
+
+    def _connect(self) -> sqlite3.Connection:
+        """ Open a connection in WAL mode, so readers don't block writers
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30,
+                               check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """ Borrow a pooled connection, waiting when all pool_size are
+        in use. A forked worker starts its own pool.
+        """
+        create = False
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._pool = queue.LifoQueue()
+                self._opened = 0
+            pool = self._pool
+            try:
+                conn = pool.get_nowait()
+            except queue.Empty:
+                conn = None
+                if self._opened < self.pool_size:
+                    self._opened += 1
+                    create = True
+        if create:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+        elif conn is None:
+            conn = pool.get()
+        try:
+            yield conn
+        finally:
+            pool.put(conn)
+
+    def close(self):
+        """ Close the idle connections of this process
+        """
+        with self._lock:
+            pool = self._pool
+            while pool is not None and not pool.empty():
+                pool.get_nowait().close()
+                self._opened -= 1
+
+    @staticmethod
+    def _column(attribute: str) -> str:
+        """ SQL expression of an attribute inside data
+        """
+        if not attribute.isidentifier():
+            raise ValueError("Invalid attribute {}".format(attribute))
+        return "json_extract(data, '$.{}')".format(attribute)
+
+    def _table(self, cls) -> str:
+        """ Table of cls, created with its indexes on first use
+        """
+        table = cls.__name__
+        if table in self._tables:
+            return table
+        with self.connection() as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute('CREATE TABLE IF NOT EXISTS "{}" '
+                         '(id TEXT PRIMARY KEY, data TEXT NOT NULL)'
+                         .format(table))
+            for attribute, unique in cls.indexed_attributes.items():
+                conn.execute('CREATE {}INDEX IF NOT EXISTS "{}_{}" '
+                             'ON "{}" ({})'.format(
+                                 "UNIQUE " if unique else "", table,
+                                 attribute, table, self._column(attribute)))
+            conn.execute('CREATE TABLE IF NOT EXISTS _counts '
+                         '(name TEXT PRIMARY KEY, count INTEGER NOT NULL)')
+            conn.execute('INSERT OR IGNORE INTO _counts '
+                         'SELECT ?, COUNT(*) FROM "{}"'.format(table),
+                         (table,))
+            for event, change in (("INSERT", "+ 1"), ("DELETE", "- 1")):
+                conn.execute('CREATE TRIGGER IF NOT EXISTS "{0}_{1}_count" '
+                             'AFTER {1} ON "{0}" BEGIN UPDATE _counts '
+                             'SET count = count {2} WHERE name = \'{0}\'; '
+                             'END'.format(table, event, change))
+        self._tables.add(table)
+        return table
+
+    def load(self, cls, background: bool = False):
+        """ Make sure the table of cls exists
+        """
+        self._table(cls)
+        notify("load", cls, [])
+
+    def save(self, obj: TypeVar('Base'), durable: bool = False):
+        """ Insert or update obj, ValueError on a unique index conflict
+        """
+        error = self.write_many(obj.__class__, [obj], [], durable)[0]
+        if error is not None:
+            raise error
+
+    def remove(self, obj: TypeVar('Base'), durable: bool = False):
+        """ Delete obj
+        """
+        self.write_many(obj.__class__, [], [obj], durable)
+
+    def write_many(self, cls, saves: list, removes: list,
+                   durable: bool = False) -> list:
+        """ Insert or update saves and delete removes in one transaction
+        Each save runs in a savepoint nested in it, so a unique index
+        conflict only drops that object. The transaction is begun
+        explicitly: sqlite3 doesn't before a SAVEPOINT, which would then
+        commit on its own. A durable write is synced to disk before
+        returning. Returns, per object of saves, None or a ValueError.
+        """
+        table = self._table(cls)
+        upsert = ('INSERT INTO "{}" (id, data) VALUES (?, ?) '
+                  'ON CONFLICT(id) DO UPDATE SET data = excluded.data'
+                  .format(table))
+        results = []
+        now = datetime.utcnow()
+        with self.connection() as conn:
+            if durable:
+                conn.execute("PRAGMA synchronous=FULL")
+            try:
+                with conn:
+                    conn.execute("BEGIN")
+                    for obj in saves:
+                        obj.updated_at = now
+                        data = json.dumps(obj.to_json(True))
+                        conn.execute("SAVEPOINT item")
+                        try:
+                            conn.execute(upsert, (obj.id, data))
+                            results.append(None)
+                        except sqlite3.IntegrityError as e:
+                            conn.execute("ROLLBACK TO item")
+                            results.append(ValueError(str(e)))
+                        conn.execute("RELEASE item")
+                    conn.executemany('DELETE FROM "{}" WHERE id = ?'
+                                     .format(table),
+                                     [(obj.id,) for obj in removes])
+            finally:
+                if durable:
+                    conn.execute("PRAGMA synchronous=NORMAL")
+        saved = [obj for obj, error in zip(saves, results) if error is None]
+        if saved:
+            notify("save", cls, saved)
+        if removes:
+            notify("remove", cls, removes)
+        return results
+
+    def compare_and_set(self, cls, id: str, attribute: str, expected,
+                        value) -> bool:
+        """ Set attribute of the stored object id to value if it still
+        equals expected, see Base.compare_and_set
+        A single UPDATE, so it is atomic across processes too
+        """
+        table = self._table(cls)
+        column = self._column(attribute)
+        now = datetime.utcnow().strftime(TIMESTAMP_FORMAT)
+        with self.connection() as conn:
+            try:
+                with conn:
+                    updated = conn.execute(
+                        'UPDATE "{}" SET data = json_set(data, \'$.{}\', ?, '
+                        '\'$.updated_at\', ?) WHERE id = ? AND {} IS ?'
+                        .format(table, attribute, column),
+                        (value, now, id, expected)).rowcount
+            except sqlite3.IntegrityError as e:
+                raise ValueError(str(e))
+        if not updated:
+            return False
+        obj = self.get(cls, id)
+        if obj is not None:
+            notify("save", cls, [obj])
+        return True
+
+    def count(self, cls) -> int:
+        """ Number of objects of cls, read from _counts: the triggers
+        update it in the transaction of each write, so it is live across
+        processes without scanning the table
+        """
+        table = self._table(cls)
+        with self.connection() as conn:
+            return conn.execute('SELECT count FROM _counts WHERE name = ?',
+                                (table,)).fetchone()[0]
+
+    def get(self, cls, id: str) -> Optional[TypeVar('Base')]:
+        """ Object of cls by ID
+        """
+        table = self._table(cls)
+        with self.connection() as conn:
+            row = conn.execute('SELECT data FROM "{}" WHERE id = ?'
+                               .format(table), (id,)).fetchone()
+        return None if row is None else cls(**json.loads(row[0]))
+
+    def search(self, cls, attributes: dict) -> List[TypeVar('Base')]:
+        """ Objects of cls with matching attributes
+        Stored scalar attributes are filtered in SQL, where indexes
+        apply; the rows are then checked like the file store does
+        """
+        table = self._table(cls)
+        fields = {name for name, _ in cls._field_slots()}
+        clauses, params = [], []
+        for k, v in attributes.items():
+            if k not in fields or not k.isidentifier():
+                continue
+            if v is None:
+                clauses.append("{} IS NULL".format(self._column(k)))
+                continue
+            if type(v) is datetime:
+                v = v.strftime(TIMESTAMP_FORMAT)
+            elif type(v) not in (str, int, float, bool):
+                continue
+            clauses.append("{} = ?".format(self._column(k)))
+            params.append(v)
+        query = 'SELECT data FROM "{}"'.format(table)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        with self.connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+        objs = [cls(**json.loads(row[0])) for row in rows]
+        return [obj for obj in objs if match_attributes(obj, attributes)]
+
+    def page(self, cls, limit: int = None, after: str = None,
+             offset: int = 0) -> List[TypeVar('Base')]:
+        """ Objects of cls ordered by ID, see Base.page
+        Walks the primary key, so a cursor page doesn't scan the table
+        """
+        table = self._table(cls)
+        query = 'SELECT data FROM "{}"'.format(table)
+        params = []
+        if after is not None:
+            query += " WHERE id > ?"
+            params.append(after)
+        query += " ORDER BY id LIMIT ? OFFSET ?"
+        params += [-1 if limit is None else limit, offset]
+        with self.connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [cls(**json.loads(row[0])) for row in rows]
+
+    def created_per_day(self, cls) -> Dict[str, int]:
+        """ Number of objects of cls by creation day
+        """
+        table = self._table(cls)
+        with self.connection() as conn:
+            rows = conn.execute(
+                "SELECT substr(json_extract(data, '$.created_at'), 1, 10) "
+                'AS day, COUNT(*) FROM "{}" GROUP BY day'.format(table))
+            return {day: count for day, count in rows if day is not None}
@@ -9,13 +9,18 @@ from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.exc import InvalidRequestError
 from db import DB
 from user import User
-import bcrypt
+from hashing import make_password, verify_password, needs_rehash
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import threading
 import uuid
 
+_rehash_executor = ThreadPoolExecutor(max_workers=1)
+
 
 def _hash_password(password: str) -> str:
     """Generates a hashed and salted version of the provided password."""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    return make_password(password)
 
 
 def _generate_uuid() -> str:
@@ -29,6 +34,40 @@ class Auth:
     def __init__(self):
         """Initializes the database connection for authentication operations."""
         self._db = DB()
+        self._rehashed = queue.Queue()
+        self._rehashing = {}
+        self._rehashing_lock = threading.Lock()
+
+    def _rehash(self, user_id: int, old_hash: bytes, password: str) -> None:
+        """
+        Hashes a password with the target settings off the request path,
+        unless the password changed since the rehash was scheduled.
+        The result is applied by the next call that touches the database.
+        """
+        with self._rehashing_lock:
+            if self._rehashing.get(user_id) != old_hash:
+                return
+        self._rehashed.put((user_id, old_hash, _hash_password(password)))
+
+    def _apply_rehashes(self) -> None:
+        """
+        Stores finished background rehashes, unless the password changed
+        in the meantime.
+        """
+        while True:
+            try:
+                user_id, old_hash, new_hash = self._rehashed.get_nowait()
+            except queue.Empty:
+                return
+            with self._rehashing_lock:
+                if self._rehashing.get(user_id) == old_hash:
+                    del self._rehashing[user_id]
+            try:
+                user = self._db.find_user_by(id=user_id)
+            except NoResultFound:
+                continue
+            if user.hashed_password == old_hash:
+                self._db.update_user(user_id, hashed_password=new_hash)
 
     def register_user(self, email: str, password: str) -> User:
         """
@@ -51,11 +90,22 @@ class Auth:
         Returns:
             bool: True if the login is valid, False otherwise.
         """
+        self._apply_rehashes()
         try:
             user = self._db.find_user_by(email=email)
-            return bcrypt.checkpw(password.encode('utf-8'), user.hashed_password)
         except NoResultFound:
             return False
+        if not verify_password(password, user.hashed_password):
+            return False
+        if needs_rehash(user.hashed_password):
+            with self._rehashing_lock:
+                scheduled = user.id in self._rehashing
+                if not scheduled:
+                    self._rehashing[user.id] = user.hashed_password
+            if not scheduled:
+                _rehash_executor.submit(self._rehash, user.id,
+                                        user.hashed_password, password)
+        return True
 
     def create_session(self, email: str) -> str:
         """
@@ -63,6 +113,7 @@ class Auth:
         Returns:
             str: The session ID, or None if the user is not found.
         """
+        self._apply_rehashes()
         session_id = _generate_uuid()
         try:
             user = self._db.find_user_by(email=email)
@@ -77,6 +128,7 @@ class Auth:
         Returns:
             str: The user's email, or None if no user is found.
         """
+        self._apply_rehashes()
         try:
             user = self._db.find_user_by(session_id=session_id)
             return user.email
@@ -121,4 +173,6 @@ class Auth:
             raise ValueError
 
         hashed_password = _hash_password(password)
+        with self._rehashing_lock:
+            self._rehashing.pop(user.id, None)
         self._db.update_user(user.id, hashed_password=hashed_password, reset_token=None)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+
+"""Password hashers, bcrypt cost calibration and hashing timings."""
+
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+
+import bcrypt
+
+DEFAULT_ROUNDS = 12
+MIN_ROUNDS = 4
+MAX_ROUNDS = 16
+
+
+class Timing:
+    """Thread-safe duration statistics for one operation."""
+
+    def __init__(self):
+        """Initializes empty statistics."""
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def record(self, seconds: float) -> None:
+        """Adds one measured duration."""
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.last = seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def as_dict(self) -> dict:
+        """
+        Returns the statistics in milliseconds.
+        Returns:
+            dict: count, mean_ms, max_ms and last_ms.
+        """
+        with self._lock:
+            return {
+                "count": self.count,
+                "mean_ms": self.total / self.count * 1000
+                if self.count else 0.0,
+                "max_ms": self.max * 1000,
+                "last_ms": self.last * 1000,
+            }
+
+
+TIMINGS = {"hash": Timing(), "verify": Timing()}
+_rounds = None
+
+
+def calibrate_rounds(target_ms: float = 250.0, min_rounds: int = MIN_ROUNDS,
+                     max_rounds: int = MAX_ROUNDS) -> int:
+    """
+    Finds the highest bcrypt cost that fits a latency budget on this host.
+    Each extra round doubles the work, so the next cost is only tried
+    when the doubled time is still within budget.
+    Returns:
+        int: The selected number of rounds.
+    """
+    password = b"calibration"
+    rounds = min_rounds
+    start = time.perf_counter()
+    bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+    elapsed = (time.perf_counter() - start) * 1000
+    while rounds < max_rounds and elapsed * 2 <= target_ms:
+        start = time.perf_counter()
+        bcrypt.hashpw(password, bcrypt.gensalt(rounds + 1))
+        measured = (time.perf_counter() - start) * 1000
+        if measured > target_ms:
+            break
+        rounds += 1
+        elapsed = measured
+    return rounds
+
+
+def get_rounds() -> int:
+    """
+    Returns the configured bcrypt cost.
+    BCRYPT_ROUNDS sets it directly; otherwise BCRYPT_TARGET_MS
+    calibrates it once for this host. Defaults to bcrypt's own default.
+    """
+    global _rounds
+    if _rounds is None:
+        if os.getenv("BCRYPT_ROUNDS"):
+            _rounds = int(os.getenv("BCRYPT_ROUNDS"))
+        elif os.getenv("BCRYPT_TARGET_MS"):
+            _rounds = calibrate_rounds(float(os.getenv("BCRYPT_TARGET_MS")))
+        else:
+            _rounds = DEFAULT_ROUNDS
+    return _rounds
+
+
+def hash_password(password: str) -> bytes:
+    """Hashes a password with bcrypt at the configured cost."""
+    start = time.perf_counter()
+    hashed = bcrypt.hashpw(password.encode('utf-8'),
+                           bcrypt.gensalt(get_rounds()))
+    TIMINGS["hash"].record(time.perf_counter() - start)
+    return hashed
+
+
+def check_password(password: str, hashed_password: bytes) -> bool:
+    """Checks a password against its bcrypt hash."""
+    start = time.perf_counter()
+    valid = bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+    TIMINGS["verify"].record(time.perf_counter() - start)
+    return valid
+
+
+class BcryptHasher:
+    """Bcrypt hashes, tuned by the configured cost."""
+
+    name = "bcrypt"
+
+    def identify(self, hashed: bytes) -> bool:
+        """Tells whether a stored hash is a bcrypt hash."""
+        return hashed[:4] in (b"$2a$", b"$2b$", b"$2y$")
+
+    def hash(self, password: str) -> bytes:
+        """Hashes a password at the configured cost."""
+        return hash_password(password)
+
+    def verify(self, password: str, hashed: bytes) -> bool:
+        """Checks a password against a bcrypt hash."""
+        return check_password(password, hashed)
+
+    def needs_rehash(self, hashed: bytes) -> bool:
+        """Tells whether a bcrypt hash uses another cost."""
+        try:
+            return int(hashed[4:6]) != get_rounds()
+        except ValueError:
+            return True
+
+
+class Pbkdf2Hasher:
+    """PBKDF2-SHA256 hashes stored as $pbkdf2-sha256$iterations$salt$hash."""
+
+    name = "pbkdf2_sha256"
+    prefix = b"$pbkdf2-sha256$"
+
+    def iterations(self) -> int:
+        """Returns the configured iteration count."""
+        return int(os.getenv("PBKDF2_ITERATIONS", "600000"))
+
+    def identify(self, hashed: bytes) -> bool:
+        """Tells whether a stored hash is a PBKDF2 hash."""
+        return hashed.startswith(self.prefix)
+
+    def _derive(self, password: str, salt: bytes, iterations: int,
+                metric: str) -> bytes:
+        """Derives the raw key and records its duration under metric."""
+        start = time.perf_counter()
+        key = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"),
+                                  salt, iterations)
+        TIMINGS[metric].record(time.perf_counter() - start)
+        return key
+
+    def hash(self, password: str) -> bytes:
+        """Hashes a password with a random salt."""
+        salt = os.urandom(16)
+        iterations = self.iterations()
+        key = self._derive(password, salt, iterations, "hash")
+        return b"$".join([self.prefix[:-1], str(iterations).encode(),
+                          base64.b64encode(salt), base64.b64encode(key)])
+
+    def verify(self, password: str, hashed: bytes) -> bool:
+        """Checks a password against a PBKDF2 hash."""
+        try:
+            _, _, iterations, salt, key = hashed.split(b"$")
+            salt = base64.b64decode(salt)
+            key = base64.b64decode(key)
+            iterations = int(iterations)
+        except ValueError:
+            return False
+        derived = self._derive(password, salt, iterations, "verify")
+        return hmac.compare_digest(derived, key)
+
+    def needs_rehash(self, hashed: bytes) -> bool:
+        """Tells whether a PBKDF2 hash uses another iteration count."""
+        try:
+            return int(hashed.split(b"$")[2]) != self.iterations()
+        except (IndexError, ValueError):
+            return True
+
+
+HASHERS = {}
+
+
+def register_hasher(hasher) -> None:
+    """Adds a hasher to the registry, replacing one with the same name."""
+    HASHERS[hasher.name] = hasher
+
+
+register_hasher(BcryptHasher())
+register_hasher(Pbkdf2Hasher())
+
+
+def target_hasher():
+    """
+    Returns the hasher new hashes are made with.
+    Selected by PASSWORD_HASHER, bcrypt by default.
+    """
+    return HASHERS[os.getenv("PASSWORD_HASHER", BcryptHasher.name)]
+
+
+def identify_hasher(hashed: bytes):
+    """Returns the registered hasher that recognizes a stored hash."""
+    if isinstance(hashed, str):
+        hashed = hashed.encode("utf-8")
+    for hasher in HASHERS.values():
+        if hasher.identify(hashed):
+            return hasher
+    return None
+
+
+def make_password(password: str) -> bytes:
+    """Hashes a password with the target hasher."""
+    return target_hasher().hash(password)
+
+
+def verify_password(password: str, hashed: bytes) -> bool:
+    """Checks a password with whichever hasher made the stored hash."""
+    if isinstance(hashed, str):
+        hashed = hashed.encode("utf-8")
+    hasher = identify_hasher(hashed)
+    return hasher is not None and hasher.verify(password, hashed)
+
+
+def needs_rehash(hashed: bytes) -> bool:
+    """Tells whether a stored hash differs from the target settings."""
+    if isinstance(hashed, str):
+        hashed = hashed.encode("utf-8")
+    target = target_hasher()
+    if identify_hasher(hashed) is not target:
+        return True
+    return target.needs_rehash(hashed)